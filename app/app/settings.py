@@ -50,12 +50,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.MemoryProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -88,9 +91,71 @@ DATABASES = {
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # Seconds workers keep their connection open between requests
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
     }
 }
 
+# Read replicas, as a comma separated list of hosts sharing the primary
+# credentials. Pointing a replica at the primary host is enough for testing.
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(
+    None,
+    os.environ.get('DB_REPLICA_HOSTS', '').split(','),
+)):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Seconds a client stays on the primary after a write. Pins are kept in the
+# cache, which must be shared by the workers (CACHE_LOCATION) with replicas.
+REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5))
+# Replicas lagging more than this many seconds are skipped
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('DB_REPLICA_MAX_LAG', 2))
+REPLICA_LAG_CHECK_INTERVAL = 1
+
+# Number of hash partitions (on user_id) of the recipe tables, 0 to keep
+# plain tables. Only used by PostgreSQL.
+DB_HASH_PARTITIONS = int(os.environ.get('DB_HASH_PARTITIONS', 0))
+
+# Cache shared by the workers: memcached at CACHE_LOCATION (host:port), or a
+# cache local to each process without it. Errors of the cache server are
+# ignored, it then behaves as an empty cache.
+if os.environ.get('CACHE_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ['CACHE_LOCATION'],
+            'OPTIONS': {
+                'ignore_exc': True,
+                'connect_timeout': 0.1,
+                'timeout': 0.1,
+            },
+        }
+    }
+
+# Request rates by client: anonymous clients by IP address, users by
+# account, and actions with a budget of their own, by user or IP address
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.AnonThrottle',
+        'core.throttling.UserThrottle',
+        'core.throttling.ScopedThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.environ.get('THROTTLE_ANON_RATE', '60/min'),
+        'user': os.environ.get('THROTTLE_USER_RATE', '600/min'),
+        'upload_image': os.environ.get('THROTTLE_UPLOAD_RATE', '60/hour'),
+        'login': os.environ.get('THROTTLE_LOGIN_RATE', '10/min'),
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -109,6 +174,29 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing, tuned with `manage.py benchmark_hasher`. Existing hashes
+# are rehashed with the current iterations on login.
+PASSWORD_HASHERS = [
+    'core.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = int(
+    os.environ.get('PASSWORD_HASH_ITERATIONS', 320000)
+)
+# Passwords verified at once by the workers of a host, 0 for no limit, and
+# seconds a login waits for its turn before being told to retry. A waiting
+# login holds its worker: by default it is told to retry at once.
+PASSWORD_HASH_CONCURRENCY = int(
+    os.environ.get('PASSWORD_HASH_CONCURRENCY', 2)
+)
+PASSWORD_HASH_WAIT = float(os.environ.get('PASSWORD_HASH_WAIT', 0))
+PASSWORD_HASH_LOCK_DIR = os.environ.get(
+    'PASSWORD_HASH_LOCK_DIR', '/tmp/password-hash-slots'
+)
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.0/topics/i18n/
 
@@ -129,9 +217,69 @@ MEDIA_URL = '/static/media/'
 STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
 
+# Writes .gz copies of the static files for nginx's gzip_static
+STATICFILES_STORAGE = 'core.storage.CompressedStaticFilesStorage'
+
+# Seconds during which a recipe image file written or reused is never
+# deleted, since the row referencing it may not be committed yet
+MEDIA_RELEASE_GRACE_SECONDS = int(
+    os.environ.get('MEDIA_RELEASE_GRACE_SECONDS', 60)
+)
+# Seconds during which `manage.py gc_media` keeps unreferenced files
+MEDIA_GC_GRACE_SECONDS = int(os.environ.get('MEDIA_GC_GRACE_SECONDS', 3600))
+# Let nginx send media files through X-Accel-Redirect to its internal
+# MEDIA_ACCEL_URL location
+MEDIA_ACCEL_REDIRECT = bool(int(os.environ.get('MEDIA_ACCEL_REDIRECT', 0)))
+MEDIA_ACCEL_URL = '/internal/media/'
+
+# Resized recipe images, evicted least recently used first past
+# RENDITION_CACHE_MAX_BYTES
+RENDITION_ROOT = '/vol/web/renditions'
+RENDITION_URL = '/internal/renditions/'
+RENDITION_CACHE_MAX_BYTES = int(
+    os.environ.get('RENDITION_CACHE_MAX_BYTES', 1024 ** 3)
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = "core.User"
+
+# Response compression: 'app' compresses in CompressionMiddleware with the
+# first of COMPRESSION_ENCODINGS the client accepts, 'proxy' leaves it to
+# nginx (gzip only) and 'off' disables it in Django
+COMPRESSION_MODE = os.environ.get('COMPRESSION_MODE', 'app')
+COMPRESSION_ENCODINGS = os.environ.get(
+    'COMPRESSION_ENCODINGS', 'zstd,br,gzip'
+).split(',')
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+
+# Days during which the deletions are kept for the clients syncing changes
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get('TOMBSTONE_RETENTION_DAYS', 30))
+
+# Number of rows up to which querysets are counted exactly, estimated past
+ESTIMATED_COUNT_THRESHOLD = int(
+    os.environ.get('ESTIMATED_COUNT_THRESHOLD', 10000)
+)
+
+# Background jobs run by `manage.py run_worker`
+# Seconds after which a running job is considered abandoned
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 3600))
+# Seconds before the first retry of a failed job, doubled at each attempt
+JOB_RETRY_DELAY = int(os.environ.get('JOB_RETRY_DELAY', 10))
+# Days during which done jobs are kept, deleted by `manage.py prune_jobs`
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 7))
+
+# Maximum number of requests in a batch, and of threads running its reads
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 4))
+
+# Share of the requests whose memory allocations are traced, from 0 (off)
+# to 1, the number of frames kept by allocation, of top allocation sites
+# kept by request, and of requests kept by each worker
+MEMORY_PROFILING_RATE = float(os.environ.get('MEMORY_PROFILING_RATE', 0))
+MEMORY_PROFILING_FRAMES = int(os.environ.get('MEMORY_PROFILING_FRAMES', 5))
+MEMORY_PROFILING_TOP = 10
+MEMORY_PROFILING_BUFFER = 100
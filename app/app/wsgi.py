@@ -14,3 +14,17 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+# Load the app in the uWSGI master before the workers are forked, unless
+# disabled with WSGI_WARMUP=0
+if os.environ.get('WSGI_WARMUP', '1') == '1':
+    from core import warmup
+
+    warmup.warm_up()
+
+    try:
+        from uwsgidecorators import postfork
+    except ImportError:
+        pass
+    else:
+        postfork(warmup.connect)
@@ -1,12 +1,55 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 
 from core import models
+from core.counting import estimated_count
+
+
+# Paginator for tables too large to count or to page through with a plain
+# OFFSET: large counts are estimated, and pages first read the primary keys
+# they hold, which the OFFSET skips through an index only, before loading
+# their rows by primary key
+class EstimatedCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)[0]
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+
+        ids = list(
+            self.object_list.values_list('pk', flat=True)[bottom:top]
+        )
+        rows = self.object_list.order_by().in_bulk(ids)
+
+        return self._get_page(
+            [rows[pk] for pk in ids if pk in rows],
+            number,
+            self
+        )
+
+
+# Admin of the tables holding one row per recipe or more. Searches match
+# the start of a name, which the upper-case indexes of migration 0010 serve.
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    ordering = ('-id',)
 
 
 class UserAdmin(admin.ModelAdmin):
     ordering = ['id']
     list_display = ['email', 'name']
+    search_fields = ['^email']
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         (_('Personal info'), {'fields': ('name',)}),
@@ -26,7 +69,23 @@ class UserAdmin(admin.ModelAdmin):
     )
 
 
+class TagAdmin(LargeTableAdmin):
+    list_display = ('name', 'user')
+    search_fields = ('^name',)
+
+
+class IngredientAdmin(LargeTableAdmin):
+    list_display = ('name', 'user')
+    search_fields = ('^name',)
+
+
+class RecipeAdmin(LargeTableAdmin):
+    list_display = ('title', 'user', 'time_minutes', 'price')
+    search_fields = ('^title',)
+    autocomplete_fields = ('user', 'tags', 'ingredients')
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
-admin.site.register(models.Recipe)
+admin.site.register(models.Tag, TagAdmin)
+admin.site.register(models.Ingredient, IngredientAdmin)
+admin.site.register(models.Recipe, RecipeAdmin)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    # Register the signal handlers releasing replaced recipe images,
+    # keeping the user counters up to date and tracking changes, and the
+    # system checks
+    def ready(self):
+        from core import changes, checks, media, stats  # noqa: F401
@@ -0,0 +1,164 @@
+import contextvars
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections, transaction
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Headers of the batch request passed on to its sub-requests. Credentials
+# are not: sub-requests run as the user the batch authenticated.
+FORWARDED_HEADERS = (
+    'HTTP_HOST',
+    'HTTP_ACCEPT',
+    'HTTP_ACCEPT_LANGUAGE',
+    'HTTP_USER_AGENT',
+    'HTTP_X_FORWARDED_FOR',
+    'HTTP_X_FORWARDED_PROTO',
+)
+
+
+# Build the request of a sub-request from the batch request, authenticated
+# as its user without running the authentication again
+def build_request(request, method, path, body=None):
+    path_info, _, query_string = path.partition('?')
+    data = b'' if body is None else json.dumps(body).encode()
+
+    environ = {
+        key: value for key, value in request.META.items()
+        if not key.startswith('HTTP_') or key in FORWARDED_HEADERS
+    }
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path_info,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': query_string,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(data)),
+        'wsgi.input': io.BytesIO(data),
+    })
+
+    sub_request = WSGIRequest(environ)
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+
+    return sub_request
+
+
+# Return a sub-response as a dict: its status, headers and body, decoded
+# when it is JSON. Other bodies are left out.
+def _describe(response):
+    if hasattr(response, 'render'):
+        response.render()
+
+    body = None
+    if response.streaming:
+        response.close()
+    elif response.get('Content-Type', '').startswith('application/json') \
+            and response.content:
+        body = json.loads(response.content)
+    elif response.get('Content-Type', '').startswith('text/'):
+        body = response.content.decode(response.charset)
+
+    return {
+        'status': response.status_code,
+        'headers': dict(response.items()),
+        'body': body,
+    }
+
+
+def _error(status, detail):
+    return {'status': status, 'headers': {}, 'body': {'detail': detail}}
+
+
+# Call the view of a write in its own transaction, rolled back when the
+# write fails, whether the view raised or returned an error
+def _call_atomic(view, request, *args, **kwargs):
+    with transaction.atomic():
+        response = view(request, *args, **kwargs)
+        if response.status_code >= 400:
+            transaction.set_rollback(True)
+
+    return response
+
+
+# Dispatch a sub-request through the URL resolver to its view
+def dispatch(request, method, path, body=None):
+    sub_request = build_request(request, method, path, body)
+    try:
+        match = resolve(sub_request.path_info)
+    except Resolver404:
+        return _error(404, 'Not found.')
+
+    if getattr(match.func, 'batchable', True) is False:
+        return _error(400, 'This endpoint cannot be batched.')
+
+    sub_request.resolver_match = match
+    call = match.func if method in SAFE_METHODS \
+        else partial(_call_atomic, match.func)
+    try:
+        response = call(sub_request, *match.args, **match.kwargs)
+        return _describe(response)
+    except Exception:
+        logger.exception('Batched %s %s failed', method, path)
+        return _error(500, 'Server error.')
+
+
+# Run a sub-request in a worker thread, closing the connections the thread
+# opened once done
+def _dispatch_in_thread(request, item):
+    try:
+        return dispatch(request, **item)
+    finally:
+        connections.close_all()
+
+
+# Dispatch the sub-requests of a batch and return their responses, in
+# order. Consecutive reads run concurrently on up to BATCH_MAX_WORKERS
+# threads; writes run alone, in order, once the reads before them are done.
+# Within a transaction everything runs in order on the current connection,
+# since other threads would not see its uncommitted writes.
+def run(request, items):
+    max_workers = getattr(settings, 'BATCH_MAX_WORKERS', 4)
+    if connections['default'].in_atomic_block:
+        max_workers = 1
+
+    responses = []
+    reads = []
+
+    def run_reads():
+        if len(reads) == 1 or max_workers == 1:
+            responses.extend(dispatch(request, **item) for item in reads)
+        elif reads:
+            with ThreadPoolExecutor(min(max_workers, len(reads))) as pool:
+                # Threads run in a copy of the current context, so that the
+                # reads are routed like the batch request itself
+                futures = [
+                    pool.submit(
+                        contextvars.copy_context().run,
+                        _dispatch_in_thread,
+                        request,
+                        item
+                    )
+                    for item in reads
+                ]
+                responses.extend(future.result() for future in futures)
+        reads.clear()
+
+    for item in items:
+        if item['method'] in SAFE_METHODS:
+            reads.append(item)
+            continue
+        run_reads()
+        responses.append(dispatch(request, **item))
+    run_reads()
+
+    return responses
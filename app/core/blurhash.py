@@ -0,0 +1,98 @@
+import math
+
+# Digits of the base 83 encoding of BlurHash
+BASE83 = (
+    '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    'abcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+)
+
+
+def _base83(value, length):
+    return ''.join(
+        BASE83[value // 83 ** (length - i) % 83]
+        for i in range(1, length + 1)
+    )
+
+
+def _srgb_to_linear(value):
+    value = value / 255
+    if value <= 0.04045:
+        return value / 12.92
+
+    return ((value + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _quantize_ac(value, maximum):
+    value = value / maximum
+    value = math.copysign(abs(value) ** 0.5, value)
+
+    return max(0, min(18, math.floor(value * 9 + 9.5)))
+
+
+# Return the BlurHash of an RGB Pillow image, with `x` by `y` components
+# (1 to 9 each). The image should be small, a few dozen pixels wide: the
+# hash only keeps its lowest frequencies.
+def encode(image, x=4, y=3):
+    width, height = image.size
+    pixels = [
+        tuple(_srgb_to_linear(channel) for channel in pixel)
+        for pixel in image.getdata()
+    ]
+
+    # Basis functions are separable, computed once for each row and column
+    columns = [
+        [math.cos(math.pi * i * px / width) for px in range(width)]
+        for i in range(x)
+    ]
+    rows = [
+        [math.cos(math.pi * j * py / height) for py in range(height)]
+        for j in range(y)
+    ]
+
+    factors = []
+    for j in range(y):
+        for i in range(x):
+            scale = (1 if i == j == 0 else 2) / (width * height)
+            r = g = b = 0.0
+            for py in range(height):
+                row = rows[j][py]
+                offset = py * width
+                for px in range(width):
+                    basis = row * columns[i][px]
+                    pr, pg, pb = pixels[offset + px]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    blurhash = _base83(x - 1 + (y - 1) * 9, 1)
+
+    if ac:
+        actual = max(abs(value) for factor in ac for value in factor)
+        quantized = max(0, min(82, math.floor(actual * 166 - 0.5)))
+        maximum = (quantized + 1) / 166
+        blurhash += _base83(quantized, 1)
+    else:
+        maximum = 1
+        blurhash += _base83(0, 1)
+
+    blurhash += _base83(
+        (_linear_to_srgb(dc[0]) << 16)
+        + (_linear_to_srgb(dc[1]) << 8)
+        + _linear_to_srgb(dc[2]),
+        4
+    )
+    for factor in ac:
+        r, g, b = (_quantize_ac(value, maximum) for value in factor)
+        blurhash += _base83(r * 19 * 19 + g * 19 + b, 2)
+
+    return blurhash
@@ -0,0 +1,150 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.transaction import TransactionManagementError
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import m2m_changed, post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core import stats
+from core.models import Ingredient, Recipe, Tag, Tombstone, UserStats
+
+# Tombstone kind of each tracked model
+KINDS = {
+    Recipe: Tombstone.RECIPE,
+    Tag: Tombstone.TAG,
+    Ingredient: Tombstone.INGREDIENT,
+}
+
+
+# Move the change sequence of a user forward by `count` and return its new
+# position. The counter row stays locked until the transaction commits, so
+# the changes of a user commit in sequence order: a client that read up to
+# a position never misses a change committed later with a lower one, as
+# long as the change is written in the same transaction: in autocommit mode
+# the lock would be released before the change is written.
+def next_change_seq(user_id, count=1):
+    connection = connections[router.db_for_write(UserStats)]
+    if not connection.in_atomic_block:
+        raise TransactionManagementError(
+            'Change sequence positions must be taken in a transaction.'
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {UserStats._meta.db_table} '
+            f'SET change_seq = change_seq + %s WHERE user_id = %s '
+            f'RETURNING change_seq',
+            [count, user_id]
+        )
+        row = cursor.fetchone()
+
+    if row is None:
+        stats.recipe_count(user_id)
+        return next_change_seq(user_id, count)
+
+    return row[0]
+
+
+# Return the position of a user in their change sequence and the highest
+# one of the tombstones pruned
+def current_change_seq(user_id):
+    stats.recipe_count(user_id)
+
+    return UserStats.objects.filter(user_id=user_id).values_list(
+        'change_seq', 'pruned_seq'
+    ).get()
+
+
+# Delete the tombstones older than TOMBSTONE_RETENTION_DAYS, recording the
+# highest position pruned for each user so that clients that synced
+# before it know they must sync everything again
+def prune_tombstones(days=None):
+    if days is None:
+        days = getattr(settings, 'TOMBSTONE_RETENTION_DAYS', 30)
+    old = Tombstone.objects.filter(
+        deleted_at__lt=timezone.now() - timedelta(days=days)
+    )
+
+    UserStats.objects.filter(
+        user__in=old.values('user_id')
+    ).update(
+        pruned_seq=Greatest(
+            'pruned_seq',
+            Coalesce(
+                Subquery(
+                    old.filter(user_id=OuterRef('user_id'))
+                    .order_by()
+                    .values('user_id')
+                    .annotate(last=Max('change_seq'))
+                    .values('last')
+                ),
+                0
+            )
+        )
+    )
+
+    return old.delete()[0]
+
+
+# Move recipes of a user forward in their change sequence, in the order of
+# `recipe_ids`, setting `fields` on them too, for the changes made with
+# queryset updates that send no signal. Only the recipes still matching
+# `queryset` are updated. Returns the last position taken.
+def recipes_changed(user_id, recipe_ids, queryset=None, **fields):
+    if queryset is None:
+        queryset = Recipe.objects.all()
+
+    last = next_change_seq(user_id, len(recipe_ids))
+    now = timezone.now()
+    for seq, recipe_id in enumerate(recipe_ids, last - len(recipe_ids) + 1):
+        queryset.filter(pk=recipe_id).update(
+            change_seq=seq,
+            updated_at=now,
+            **fields
+        )
+
+    return last
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=Tag)
+@receiver(pre_save, sender=Ingredient)
+def tracked_saving(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.change_seq = next_change_seq(instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def tracked_deleted(sender, instance, **kwargs):
+    Tombstone.objects.create(
+        user_id=instance.user_id,
+        kind=KINDS[sender],
+        object_id=instance.pk,
+        change_seq=next_change_seq(instance.user_id),
+    )
+
+
+# Changing the tags or ingredients of recipes changes the recipes
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_links_changed(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif pk_set:
+        recipe_ids = sorted(pk_set)
+    else:
+        return
+
+    last = recipes_changed(instance.user_id, recipe_ids)
+    if not reverse:
+        instance.change_seq = last
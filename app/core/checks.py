@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+# Clients written to are pinned to the primary in the cache: a cache local
+# to each process only pins them on the worker that served the write
+@register()
+def replica_pins_shared(app_configs, **kwargs):
+    backend = settings.CACHES['default']['BACKEND']
+    if not getattr(settings, 'DATABASE_REPLICAS', []) \
+            or not backend.endswith('LocMemCache'):
+        return []
+
+    return [Warning(
+        'Read replicas are used with a cache local to each process.',
+        hint='Set CACHE_LOCATION to a cache server shared by the workers, '
+             'or clients may read stale data right after writing.',
+        id='core.W001',
+    )]
@@ -0,0 +1,141 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Types of the responses and files worth compressing
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+)
+
+
+# Streaming compressors: `compress()` returns the output ready so far,
+# `flush()` the rest of the output of the data given, and `finish()` the end
+# of the stream
+class GzipCompressor:
+    default_level = 6
+
+    def __init__(self, level=None):
+        # wbits 31 writes a gzip header and trailer
+        self._compressor = zlib.compressobj(
+            self.default_level if level is None else level,
+            zlib.DEFLATED,
+            31,
+        )
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    default_level = 5
+
+    def __init__(self, level=None):
+        self._compressor = brotli.Compressor(
+            quality=self.default_level if level is None else level,
+        )
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    default_level = 3
+
+    def __init__(self, level=None):
+        self._compressor = zstandard.ZstdCompressor(
+            level=self.default_level if level is None else level,
+        ).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+# Compressors of the content codings whose libraries are installed, by
+# order of preference
+COMPRESSORS = {
+    name: compressor
+    for name, compressor, library in (
+        ('zstd', ZstdCompressor, zstandard),
+        ('br', BrotliCompressor, brotli),
+        ('gzip', GzipCompressor, zlib),
+    )
+    if library is not None
+}
+
+
+def is_compressible(content_type):
+    return content_type.split(';')[0].strip().startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(data, encoding, level=None):
+    compressor = COMPRESSORS[encoding](level)
+
+    return compressor.compress(data) + compressor.finish()
+
+
+# Compress an iterable of chunks, flushing after each so that every chunk
+# reaches the client as soon as it is produced
+def compress_stream(chunks, encoding, level=None):
+    compressor = COMPRESSORS[encoding](level)
+
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+
+    yield compressor.finish()
+
+
+# Return the encoding of `encodings` (by order of preference) with the
+# highest quality in an Accept-Encoding header, or None
+def negotiate(accept_encoding, encodings):
+    qualities = {}
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding.strip():
+            qualities[coding.strip()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if encoding in COMPRESSORS and quality > best_quality:
+            best, best_quality = encoding, quality
+
+    return best
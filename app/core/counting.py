@@ -0,0 +1,59 @@
+import json
+
+from django.conf import settings
+from django.db import connections
+
+
+# Planner estimate of the number of rows of the table of a model, summed
+# over its partitions, or None when the table was never analyzed. The
+# estimates of partitioned tables themselves would count their rows twice.
+def table_estimate(model, using='default'):
+    table = model._meta.db_table
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT sum(greatest(reltuples, 0)), max(reltuples) '
+            'FROM pg_class '
+            'WHERE (oid = %s::regclass AND relkind <> %s) OR oid IN ('
+            '  SELECT inhrelid FROM pg_inherits '
+            '  WHERE inhparent = %s::regclass'
+            ')',
+            [table, 'p', table]
+        )
+        total, analyzed = cursor.fetchone()
+
+    if analyzed is None or analyzed < 0:
+        return None
+
+    return int(total)
+
+
+# Planner estimate of the number of rows of a queryset
+def plan_estimate(queryset):
+    plan = json.loads(queryset.order_by().explain(format='json'))
+
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+# Return the number of rows of a queryset and whether it is an estimate.
+# Counts are exact up to `threshold` rows: counting stops there, so the cost
+# is bounded. Past it, PostgreSQL databases return the planner's estimate,
+# from the table statistics for unfiltered querysets.
+def estimated_count(queryset, threshold=None):
+    if threshold is None:
+        threshold = getattr(settings, 'ESTIMATED_COUNT_THRESHOLD', 10000)
+
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count(), False
+
+    capped = queryset.order_by()[:threshold].count()
+    if capped < threshold:
+        return capped, False
+
+    estimate = None
+    if not queryset.query.where:
+        estimate = table_estimate(queryset.model, queryset.db)
+    if estimate is None:
+        estimate = plan_estimate(queryset)
+
+    return max(estimate, threshold), True
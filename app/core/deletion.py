@@ -0,0 +1,118 @@
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from rest_framework.authtoken.models import Token
+
+from core import jobs
+from core.models import Ingredient, Recipe, RecipeBucket, RecipeSignature, \
+    Tag
+
+logger = logging.getLogger(__name__)
+
+
+# DELETE the rows of `model` whose `column` is in `ids` with one statement
+def _delete_where_in(model, column, ids):
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {model._meta.db_table} '
+            f'WHERE {column} IN ({placeholders})',
+            list(ids)
+        )
+        return cursor.rowcount
+
+
+# Delete one batch of recipes with their links, signatures and buckets, and
+# return the image files to remove once the batch is committed. The rows
+# referencing the recipes are deleted first and explicitly: partitioned
+# tables have no foreign key to delete them or to catch those left behind.
+def _purge_recipes(user_id, batch_size):
+    with transaction.atomic():
+        rows = list(
+            Recipe.objects.filter(user_id=user_id)
+            .order_by('id')
+            .values_list('id', 'image')[:batch_size]
+        )
+        if not rows:
+            return 0, []
+
+        ids = [recipe_id for recipe_id, _ in rows]
+        _delete_where_in(Recipe.tags.through, 'recipe_id', ids)
+        _delete_where_in(Recipe.ingredients.through, 'recipe_id', ids)
+        _delete_where_in(RecipeBucket, 'recipe_id', ids)
+        _delete_where_in(RecipeSignature, 'recipe_id', ids)
+        _delete_where_in(Recipe, 'id', ids)
+
+    return len(ids), [image for _, image in rows if image]
+
+
+# Delete one batch of tags or ingredients with the links to them
+def _purge_attributes(model, through_column, user_id, batch_size):
+    with transaction.atomic():
+        ids = list(
+            model.objects.filter(user_id=user_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+
+        through = Recipe.tags.through if model is Tag \
+            else Recipe.ingredients.through
+        _delete_where_in(through, through_column, ids)
+        _delete_where_in(model, 'id', ids)
+
+    return len(ids)
+
+
+# Deactivate a user and queue the deletion of the account, so the request
+# returns right away whatever the amount of data to delete
+def delete_user(user):
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        Token.objects.filter(user=user).delete()
+        purge_user.delay(user.id)
+
+
+# Delete all the data of a user in bounded batches of raw DELETE statements,
+# image files included, then the user itself. Django's collector would load
+# every related row in memory before deleting anything.
+# `progress(step, count)` is called after each batch with the number of
+# rows deleted so far by the step.
+@jobs.task(priority=-10, max_attempts=5)
+def purge_user(user_id, batch_size=None, progress=None):
+    batch_size = batch_size or getattr(settings, 'PURGE_BATCH_SIZE', 1000)
+
+    def report(step, count):
+        logger.info('Purging user %s: %s %s deleted', user_id, count, step)
+        if progress is not None:
+            progress(step, count)
+
+    image_field = Recipe._meta.get_field('image')
+    deleted = 0
+    while True:
+        count, images = _purge_recipes(user_id, batch_size)
+        # Images can be shared with the recipes of other users
+        image_field.storage.release(images, image_field)
+        if not count:
+            break
+        deleted += count
+        report('recipes', deleted)
+
+    for step, model, column in (('tags', Tag, 'tag_id'),
+                                ('ingredients', Ingredient,
+                                 'ingredient_id')):
+        deleted = 0
+        while True:
+            count = _purge_attributes(model, column, user_id, batch_size)
+            if not count:
+                break
+            deleted += count
+            report(step, deleted)
+
+    # Only a handful of rows are left, the collector can handle them
+    get_user_model().objects.filter(id=user_id).delete()
+    report('users', 1)
@@ -0,0 +1,62 @@
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+# PBKDF2 hasher whose number of iterations is the PASSWORD_HASH_ITERATIONS
+# setting. Hashes with another number are rehashed on the next successful
+# login, so changing the setting takes effect as users log in.
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+
+    @property
+    def iterations(self):
+        return getattr(
+            settings,
+            'PASSWORD_HASH_ITERATIONS',
+            PBKDF2PasswordHasher.iterations
+        )
+
+
+class VerificationBusy(Exception):
+    pass
+
+
+# Hold one of the PASSWORD_HASH_CONCURRENCY slots shared by every worker of
+# the host while hashing passwords, so that a burst of logins leaves workers
+# free for the other requests. Raises VerificationBusy when no slot was free
+# within `timeout` seconds, PASSWORD_HASH_WAIT by default: with 0 the slots
+# are only tried once, so a login that would wait frees its worker at once.
+@contextmanager
+def verification_slot(timeout=None):
+    slots = getattr(settings, 'PASSWORD_HASH_CONCURRENCY', 0)
+    if slots <= 0:
+        yield
+        return
+
+    if timeout is None:
+        timeout = getattr(settings, 'PASSWORD_HASH_WAIT', 0)
+    directory = settings.PASSWORD_HASH_LOCK_DIR
+    os.makedirs(directory, exist_ok=True)
+    deadline = time.monotonic() + timeout
+
+    while True:
+        for slot in range(slots):
+            lock = open(os.path.join(directory, f'slot-{slot}.lock'), 'a')
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                continue
+
+            # Closing the file releases the lock
+            with lock:
+                yield
+            return
+
+        if time.monotonic() >= deadline:
+            raise VerificationBusy
+        time.sleep(0.01)
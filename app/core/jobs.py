@@ -0,0 +1,159 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Functions that can be run as jobs, by dotted path
+_tasks = {}
+
+
+# Register a function as a job task and give it a `delay()` method
+# enqueuing a call to it
+def task(func=None, *, priority=0, max_attempts=3):
+    def register(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+        _tasks[name] = func
+
+        def delay(*args, **kwargs):
+            return enqueue(name, args, kwargs, priority=priority,
+                           max_attempts=max_attempts)
+
+        func.task_name = name
+        func.delay = delay
+        return func
+
+    return register(func) if func is not None else register
+
+
+# Store a job calling a task; it runs once the current transaction commits
+def enqueue(name, args=(), kwargs=None, priority=0, max_attempts=3,
+            run_at=None):
+    return Job.objects.create(
+        task=name,
+        args=list(args),
+        kwargs=kwargs or {},
+        priority=priority,
+        max_attempts=max_attempts,
+        run_at=run_at or timezone.now(),
+    )
+
+
+def _get_task(name):
+    if name not in _tasks:
+        # Importing the module registers its tasks
+        import_string(name)
+    if name not in _tasks:
+        raise LookupError(f'{name} is not a registered task')
+
+    return _tasks[name]
+
+
+# Lock up to `limit` due jobs, highest priority first, and mark them as
+# running. Locked rows are skipped so workers never wait on each other.
+# Jobs running for longer than JOB_LOCK_TIMEOUT are assumed abandoned by a
+# dead worker and claimed again, or failed when they used all their
+# attempts: a job killing its worker must not run forever.
+def claim(limit=1):
+    now = timezone.now()
+    stale = now - timedelta(
+        seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 3600)
+    )
+    abandoned = Q(status=Job.RUNNING, locked_at__lt=stale)
+
+    with transaction.atomic():
+        exhausted = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(abandoned, attempts__gte=F('max_attempts'))
+        )
+        for job in exhausted:
+            job.status = Job.FAILED
+            job.locked_at = None
+            job.last_error = f'Abandoned after {job.attempts} attempts'
+            logger.error('Job %s (%s) abandoned', job.id, job.task)
+        Job.objects.bulk_update(
+            exhausted,
+            ['status', 'locked_at', 'last_error']
+        )
+
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Job.QUEUED, run_at__lte=now)
+                | (abandoned & Q(attempts__lt=F('max_attempts')))
+            )
+            .order_by('-priority', 'run_at', 'id')[:limit]
+        )
+        for job in jobs:
+            job.status = Job.RUNNING
+            job.locked_at = now
+            job.attempts += 1
+
+        Job.objects.bulk_update(jobs, ['status', 'locked_at', 'attempts'])
+
+    return [job.id for job in jobs]
+
+
+# Delete the done jobs due more than JOB_RETENTION_DAYS ago. Failed jobs
+# are kept for their errors to be looked into.
+def prune_jobs(days=None):
+    if days is None:
+        days = getattr(settings, 'JOB_RETENTION_DAYS', 7)
+
+    return Job.objects.filter(
+        status=Job.DONE,
+        run_at__lt=timezone.now() - timedelta(days=days),
+    ).delete()[0]
+
+
+# Seconds to wait before retrying a job that failed `attempts` times
+def retry_delay(attempts):
+    return getattr(settings, 'JOB_RETRY_DELAY', 10) * 2 ** (attempts - 1)
+
+
+# Run a claimed job and record its outcome. Failed jobs are retried with
+# an exponential backoff until they reach their maximum attempts.
+def execute(job_id):
+    job = Job.objects.get(id=job_id)
+
+    try:
+        _get_task(job.task)(*job.args, **job.kwargs)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + timedelta(
+                seconds=retry_delay(job.attempts)
+            )
+            logger.warning('Job %s (%s) failed, retrying', job.id, job.task)
+        else:
+            job.status = Job.FAILED
+            logger.error('Job %s (%s) failed', job.id, job.task)
+    else:
+        job.status = Job.DONE
+        job.last_error = ''
+
+    job.locked_at = None
+    job.save(update_fields=['status', 'run_at', 'locked_at', 'last_error'])
+
+    return job.status
+
+
+# Run a job from a worker thread or process, dropping the database
+# connections that are broken or past CONN_MAX_AGE around it like a request
+def execute_in_worker(job_id):
+    if not connection.in_atomic_block:
+        close_old_connections()
+    try:
+        return execute(job_id)
+    finally:
+        if not connection.in_atomic_block:
+            close_old_connections()
@@ -0,0 +1,99 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from core import changes, media
+from core.models import Recipe
+
+
+# Return the metadata of the image at `path`, or None when it cannot be read
+def _read_metadata(path):
+    try:
+        return media.image_metadata(path)
+    except media.UNREADABLE_IMAGE_ERRORS:
+        return None
+
+
+# Django command to compute the size, color and placeholder of the recipe
+# images uploaded before they were computed on upload. Images are decoded
+# by a pool of processes, once per file however many recipes share it.
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of image names read per query',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Number of processes decoding images',
+        )
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        done = failed = 0
+
+        with ProcessPoolExecutor(options['workers']) as pool:
+            for names in self._image_names(options['batch_size']):
+                results = pool.map(
+                    _read_metadata,
+                    [storage.path(name) for name in names],
+                    chunksize=16,
+                )
+                for name, metadata in zip(names, results):
+                    if metadata is None:
+                        failed += 1
+                        continue
+                    self._update(name, metadata)
+                    done += 1
+
+                self.stdout.write(f'{done} images done, {failed} failed')
+
+        self.stdout.write(self.style.SUCCESS('Image metadata backfilled!'))
+
+    # Store the metadata of an image in the recipes using it, which move
+    # forward in the change sequence of their users so that clients sync it
+    def _update(self, name, metadata):
+        queryset = Recipe.objects.filter(image=name, image_width__isnull=True)
+        recipes = {}
+        for recipe_id, user_id in queryset.order_by('id').values_list(
+            'id', 'user_id'
+        ):
+            recipes.setdefault(user_id, []).append(recipe_id)
+
+        for user_id, recipe_ids in recipes.items():
+            with transaction.atomic():
+                changes.recipes_changed(
+                    user_id,
+                    recipe_ids,
+                    queryset,
+                    **metadata
+                )
+
+    # Distinct names of the images without metadata, read by keyset pages of
+    # `batch_size`
+    def _image_names(self, batch_size):
+        images = Recipe.objects.exclude(image='').filter(
+            image__isnull=False,
+            image_width__isnull=True,
+        )
+        last = ''
+
+        while True:
+            names = list(
+                images.filter(image__gt=last)
+                .order_by('image')
+                .values_list('image', flat=True)
+                .distinct()[:batch_size]
+            )
+            if not names:
+                return
+
+            yield names
+            last = names[-1]
@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from core.hashers import TunablePBKDF2PasswordHasher
+
+
+# Django command to time password hashing at several numbers of iterations
+# and suggest the number hashing a password in the target time, for the
+# PASSWORD_HASH_ITERATIONS setting
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            nargs='+',
+            default=[100000, 320000, 600000],
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--target-ms',
+            type=float,
+            default=250,
+            help='Time a login may spend hashing the password',
+        )
+
+    def handle(self, *args, **options):
+        hasher = TunablePBKDF2PasswordHasher()
+        salt = hasher.salt()
+
+        self.stdout.write(
+            f'Current: {settings.PASSWORD_HASH_ITERATIONS} iterations, '
+            f'{settings.PASSWORD_HASH_CONCURRENCY} concurrent logins'
+        )
+        self.stdout.write(
+            f'{"iterations":>12}{"ms":>10}{"logins/s/core":>16}'
+        )
+        rates = []
+        for iterations in options['iterations']:
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                hasher.encode('benchmark password', salt, iterations)
+                timings.append(time.perf_counter() - start)
+
+            best = min(timings)
+            rates.append(iterations / best)
+            self.stdout.write(
+                f'{iterations:>12}{best * 1000:>10.1f}{1 / best:>16.1f}'
+            )
+
+        suggested = max(rates) * options['target_ms'] / 1000
+        self.stdout.write(self.style.SUCCESS(
+            f'{int(suggested) // 10000 * 10000} iterations hash in about '
+            f'{options["target_ms"]:.0f} ms'
+        ))
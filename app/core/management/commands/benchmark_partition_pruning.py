@@ -0,0 +1,62 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from core import partitioning
+from core.models import Ingredient, Recipe, Tag
+
+
+# Django command showing which partitions the per-user queries of the API
+# scan, and how long they take
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning requires PostgreSQL')
+
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError('User does not exist')
+
+        recipe_ids = list(
+            Recipe.objects.filter(user=user).values_list('id', flat=True)[:50]
+        )
+        queries = {
+            'recipes': Recipe.objects.filter(user=user),
+            'tags': Tag.objects.filter(user=user).order_by('-name'),
+            'ingredients':
+                Ingredient.objects.filter(user=user).order_by('-name'),
+            'recipe tags': Recipe.tags.through.objects.filter(
+                recipe_id__in=recipe_ids
+            ),
+            'recipe ingredients': Recipe.ingredients.through.objects.filter(
+                recipe_id__in=recipe_ids
+            ),
+        }
+
+        for name, queryset in queries.items():
+            plan = json.loads(queryset.explain(format='json', analyze=True))
+            relations = partitioning.scanned_relations(plan)
+            table = queryset.model._meta.db_table
+
+            self.stdout.write(
+                f'{name:<20}'
+                f'{len(relations)} of {self._partitions(table)} '
+                f'partitions scanned, '
+                f'{plan[0]["Execution Time"]:.2f} ms'
+            )
+
+    def _partitions(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT count(*) FROM pg_inherits '
+                'WHERE inhparent = %s::regclass',
+                [table]
+            )
+            return cursor.fetchone()[0] or 1
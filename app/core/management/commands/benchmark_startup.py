@@ -0,0 +1,102 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+# Run in a fresh interpreter: load the WSGI application, then send it the
+# same request twice, printing the timings in milliseconds
+CHILD = '''
+import io, json, os, sys, time
+
+start = time.perf_counter()
+from app.wsgi import application
+loaded = time.perf_counter()
+
+path, _, query = sys.argv[1].partition('?')
+
+def request():
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': sys.argv[3],
+        'SERVER_PORT': '80',
+        'HTTP_HOST': sys.argv[3],
+        'HTTP_AUTHORIZATION': 'Token ' + sys.argv[2],
+        'wsgi.input': io.BytesIO(),
+        'wsgi.url_scheme': 'http',
+        'wsgi.errors': sys.stderr,
+    }
+    started = time.perf_counter()
+    status = []
+    body = b''.join(application(environ, lambda s, h: status.append(s)))
+    assert status[0].startswith('200'), status[0]
+    return time.perf_counter() - started, len(body)
+
+first, size = request()
+second, _ = request()
+print(json.dumps({
+    'load': (loaded - start) * 1000,
+    'first': first * 1000,
+    'second': second * 1000,
+}))
+'''
+
+
+# Django command to measure the cold start of a worker, with and without
+# the warmup: the time to load the app, to answer the first request and to
+# answer the next one. Under uWSGI the app is loaded once in the master, so
+# a forked worker only pays for its first request.
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--path', default='/api/recipe/recipes/')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError('User does not exist')
+        token, _ = Token.objects.get_or_create(user=user)
+        host = next(
+            (host.lstrip('.') for host in settings.ALLOWED_HOSTS
+             if host != '*'),
+            'localhost'
+        )
+
+        self.stdout.write(
+            f'{"warmup":<8}{"load ms":>10}{"first ms":>10}'
+            f'{"next ms":>10}{"load+first":>12}'
+        )
+        for warmup in ('0', '1'):
+            runs = []
+            for _ in range(options['repeat']):
+                result = subprocess.run(
+                    [
+                        sys.executable, '-c', CHILD,
+                        options['path'], token.key, host,
+                    ],
+                    env={**os.environ, 'WSGI_WARMUP': warmup},
+                    capture_output=True,
+                    text=True,
+                )
+                if result.returncode != 0:
+                    raise CommandError(result.stderr)
+                runs.append(json.loads(result.stdout.splitlines()[-1]))
+
+            load, first, second = (
+                statistics.median(run[key] for run in runs)
+                for key in ('load', 'first', 'second')
+            )
+            self.stdout.write(
+                f'{"on" if warmup == "1" else "off":<8}{load:>10.1f}'
+                f'{first:>10.1f}{second:>10.1f}{load + first:>12.1f}'
+            )
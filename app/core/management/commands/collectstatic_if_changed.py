@@ -0,0 +1,52 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.core.management import BaseCommand, call_command
+
+# File of STATIC_ROOT recording the fingerprint of the last collection
+FINGERPRINT_FILE = '.collectstatic-fingerprint'
+
+
+# Return a fingerprint of the static files the finders would collect, from
+# their paths, sizes and modification times, and of the storage they are
+# collected with
+def static_fingerprint():
+    digest = hashlib.sha256(settings.STATICFILES_STORAGE.encode())
+
+    entries = []
+    for finder in get_finders():
+        for path, storage in finder.list([]):
+            stat = os.stat(storage.path(path))
+            entries.append(f'{path}:{stat.st_size}:{int(stat.st_mtime)}')
+
+    for entry in sorted(entries):
+        digest.update(entry.encode())
+        digest.update(b'\n')
+
+    return digest.hexdigest()
+
+
+# Django command to collect the static files unless they did not change
+# since the last collection, which then costs a scan of the sources only
+class Command(BaseCommand):
+
+    def handle(self, *args, **options):
+        fingerprint = static_fingerprint()
+        path = os.path.join(settings.STATIC_ROOT, FINGERPRINT_FILE)
+
+        try:
+            with open(path) as f:
+                collected = f.read().strip()
+        except FileNotFoundError:
+            collected = None
+
+        if collected == fingerprint:
+            self.stdout.write('Static files unchanged, skipping')
+            return
+
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(path, 'w') as f:
+            f.write(fingerprint)
+        self.stdout.write(self.style.SUCCESS('Static files collected'))
@@ -0,0 +1,82 @@
+import os
+
+from django.core.management import BaseCommand
+
+from core.models import Recipe
+from core.storage import content_hash, content_name, is_content_name
+
+
+# Django command to rename the recipe images stored before the content
+# addressed storage to the hash of their content, so that identical images
+# share a single file
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of image names read per query',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be done without changing anything',
+        )
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        renamed = shared = missing = freed = 0
+
+        for name in self._image_names(options['batch_size']):
+            if is_content_name(name):
+                continue
+
+            path = storage.path(name)
+            if not os.path.exists(path):
+                missing += 1
+                continue
+
+            with storage.open(name) as f:
+                new_name = content_name(name, content_hash(f))
+            new_path = storage.path(new_name)
+
+            renamed += 1
+            if os.path.exists(new_path):
+                shared += 1
+                freed += os.path.getsize(path)
+            if options['dry_run']:
+                continue
+
+            # Link first and delete last so that an interrupted run leaves
+            # every row pointing to an existing file
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            try:
+                os.link(path, new_path)
+            except FileExistsError:
+                pass
+            Recipe.objects.filter(image=name).update(image=new_name)
+            storage.delete(name)
+
+        self.stdout.write(
+            f'{renamed} images renamed, {shared} shared with an identical '
+            f'image ({freed} bytes freed), {missing} missing'
+        )
+        self.stdout.write(self.style.SUCCESS('Media deduplicated!'))
+
+    # Distinct image names, read by keyset pages of `batch_size`
+    def _image_names(self, batch_size):
+        images = Recipe.objects.exclude(image='').exclude(image__isnull=True)
+        last = ''
+
+        while True:
+            names = list(
+                images.filter(image__gt=last)
+                .order_by('image')
+                .values_list('image', flat=True)
+                .distinct()[:batch_size]
+            )
+            if not names:
+                return
+            yield from names
+            last = names[-1]
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from core.media import collect_garbage
+
+
+# Django command to delete the recipe image files no recipe references
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of files checked and deleted per query',
+        )
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=getattr(settings, 'MEDIA_GC_GRACE_SECONDS', 3600),
+            help='Seconds during which new files are never deleted',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the orphaned files without deleting them',
+        )
+
+    def handle(self, *args, **options):
+        verb = 'found' if options['dry_run'] else 'deleted'
+
+        scanned, orphans, reclaimed = collect_garbage(
+            batch_size=options['batch_size'],
+            grace=options['grace'],
+            dry_run=options['dry_run'],
+            progress=lambda scanned, orphans, reclaimed: self.stdout.write(
+                f'{scanned} files scanned, {orphans} orphans {verb}'
+            ),
+        )
+
+        self.stdout.write(
+            f'{orphans} orphaned files {verb} out of {scanned} '
+            f'({reclaimed} bytes)'
+        )
+        self.stdout.write(self.style.SUCCESS('Media collected!'))
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core import partitioning
+
+
+# Django command to hash partition the recipe tables on user_id
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--partitions',
+            type=int,
+            default=settings.DB_HASH_PARTITIONS or 16,
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning requires PostgreSQL')
+        if options['partitions'] < 2:
+            raise CommandError('At least 2 partitions are required')
+
+        with transaction.atomic():
+            converted = partitioning.partition_tables(
+                connection,
+                options['partitions']
+            )
+
+        for table in converted:
+            self.stdout.write(f'{table} partitioned')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(converted)} tables partitioned!'
+        ))
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from core.jobs import prune_jobs
+
+
+# Django command to delete the jobs done long ago from the job queue
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'JOB_RETENTION_DAYS', 7),
+            help='Age in days of the done jobs to delete',
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_jobs(options['days'])
+
+        self.stdout.write(self.style.SUCCESS(f'{deleted} jobs pruned!'))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from core.changes import prune_tombstones
+
+
+# Django command to delete the old tombstones of deleted recipes, tags and
+# ingredients. Clients that last synced before them must sync everything.
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'TOMBSTONE_RETENTION_DAYS', 30),
+            help='Age in days of the tombstones to delete',
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones(options['days'])
+
+        self.stdout.write(self.style.SUCCESS(f'{deleted} tombstones pruned!'))
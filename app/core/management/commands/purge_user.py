@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from core.deletion import purge_user
+
+
+# Django command to delete a user and all their data in batches
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows deleted per statement',
+        )
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(f'No user with email {options["email"]}')
+
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+
+        purge_user(
+            user.id,
+            batch_size=options['batch_size'],
+            progress=lambda step, count: self.stdout.write(
+                f'{count} {step} deleted'
+            ),
+        )
+
+        self.stdout.write(self.style.SUCCESS('User deleted!'))
@@ -0,0 +1,132 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, \
+    ThreadPoolExecutor, wait
+
+import django
+from django.core.management import BaseCommand
+
+from core import jobs
+
+
+# Django command to run the jobs of the database queue
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of jobs run at the same time',
+        )
+        parser.add_argument(
+            '--pool',
+            choices=('thread', 'process'),
+            default='thread',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queue is empty',
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once the queue is empty',
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.stdout.write(
+            f'Worker started with {options["concurrency"]} '
+            f'{options["pool"]}(s)'
+        )
+
+        if options['concurrency'] == 1:
+            done = self._run_inline(options)
+        else:
+            done = self._run_pool(options)
+
+        self.stdout.write(self.style.SUCCESS(f'{done} jobs run!'))
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    # Run the jobs one at a time in this process
+    def _run_inline(self, options):
+        done = 0
+
+        while not self.stopping:
+            claimed = jobs.claim(1)
+            if not claimed:
+                if options['burst']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self._report(claimed[0], jobs.execute_in_worker(claimed[0]))
+            done += 1
+
+        return done
+
+    # Keep a pool of threads or processes busy with claimed jobs
+    def _run_pool(self, options):
+        concurrency = options['concurrency']
+        if options['pool'] == 'process':
+            # Spawned rather than forked so that processes never share the
+            # database connections of this one
+            executor = ProcessPoolExecutor(
+                concurrency,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        else:
+            executor = ThreadPoolExecutor(concurrency)
+
+        running = {}
+        done = 0
+        with executor:
+            while not self.stopping:
+                claimed = []
+                if len(running) < concurrency:
+                    claimed = jobs.claim(concurrency - len(running))
+                for job_id in claimed:
+                    future = executor.submit(jobs.execute_in_worker, job_id)
+                    running[future] = job_id
+
+                if not running:
+                    if options['burst']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                finished, _ = wait(
+                    running,
+                    timeout=options['poll_interval'],
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in finished:
+                    self._collect(running.pop(future), future)
+                    done += 1
+
+            for future in wait(running).done:
+                self._collect(running.pop(future), future)
+                done += 1
+
+        return done
+
+    def _collect(self, job_id, future):
+        try:
+            status = future.result()
+        except Exception as exc:
+            status = f'error ({exc})'
+
+        self._report(job_id, status)
+
+    def _report(self, job_id, status):
+        self.stdout.write(f'Job {job_id}: {status}')
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from core.partitioning import sweep_orphans
+
+
+# Django command to delete the links, signatures and buckets left behind by
+# deleted recipes, tags and ingredients. Partitioned tables have no foreign
+# keys to prevent them: run it periodically, like prune_tombstones.
+class Command(BaseCommand):
+
+    def handle(self, *args, **options):
+        deleted = sweep_orphans()
+
+        for table, count in deleted.items():
+            self.stdout.write(f'{count} rows deleted from {table}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(deleted.values())} orphans swept!'
+        ))
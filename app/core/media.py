@@ -0,0 +1,381 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, \
+    pre_save
+from django.dispatch import receiver
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from PIL import Image
+
+from core import blurhash, jobs
+from core.models import Recipe
+
+# Directory of the recipe images in the media storage
+RECIPE_IMAGE_DIR = 'uploads/recipe'
+
+# Allowed rendition widths, and formats as (Pillow format, content type,
+# extension)
+RENDITION_WIDTHS = (160, 320, 640, 1280)
+RENDITION_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'png': ('PNG', 'image/png', 'png'),
+}
+
+# Largest side of the thumbnail the color and placeholder of an image are
+# computed from
+PLACEHOLDER_SIZE = 32
+
+# Errors of images that cannot be read: truncated or unknown files, and
+# images with more pixels than Pillow's MAX_IMAGE_PIXELS guard against
+UNREADABLE_IMAGE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+# Metadata of recipes without image
+NO_IMAGE_METADATA = {
+    'image_width': None,
+    'image_height': None,
+    'image_color': '',
+    'image_placeholder': '',
+}
+
+# Cache key of the bytes written to the rendition cache since the last
+# eviction
+RENDITION_WRITTEN_KEY = 'core:renditions:written'
+
+
+def _image_field():
+    return Recipe._meta.get_field('image')
+
+
+# Yield lists of at most `size` (name, modification time, size) of the files
+# under `directory` of `storage`. Directories are read one at a time and
+# never listed whole, so memory stays bounded whatever the number of files.
+def _file_batches(storage, directory, size):
+    pending = [storage.path(directory)]
+
+    while pending:
+        batch = []
+        try:
+            entries = os.scandir(pending.pop())
+        except FileNotFoundError:
+            continue
+
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+
+                stat = entry.stat(follow_symlinks=False)
+                name = os.path.relpath(entry.path, storage.location)
+                batch.append((
+                    name.replace(os.sep, '/'),
+                    stat.st_mtime,
+                    stat.st_size,
+                ))
+                if len(batch) >= size:
+                    yield batch
+                    batch = []
+
+        if batch:
+            yield batch
+
+
+# Delete the recipe image files no recipe references, batch by batch: each
+# batch of files is checked against the indexed image column with one query.
+# Files modified within the last `grace` seconds are kept since the upload
+# referencing them may not be committed yet.
+# Returns the number of files scanned, of orphans and of bytes reclaimed.
+def collect_garbage(batch_size=1000, grace=None, dry_run=False,
+                    progress=None):
+    field = _image_field()
+    storage = field.storage
+    if grace is None:
+        grace = getattr(settings, 'MEDIA_GC_GRACE_SECONDS', 3600)
+    cutoff = time.time() - grace
+    scanned = orphans = reclaimed = 0
+
+    for batch in _file_batches(storage, RECIPE_IMAGE_DIR, batch_size):
+        scanned += len(batch)
+        candidates = {
+            name: size for name, mtime, size in batch if mtime < cutoff
+        }
+        referenced = set(
+            Recipe._base_manager
+            .filter(image__in=candidates)
+            .values_list('image', flat=True)
+        )
+
+        for name, size in candidates.items():
+            if name in referenced:
+                continue
+            if not dry_run:
+                # An upload of the same content may have reused the file
+                # since the batch was read
+                try:
+                    if os.path.getmtime(storage.path(name)) >= cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+                storage.delete(name)
+            orphans += 1
+            reclaimed += size
+
+        if progress is not None:
+            progress(scanned, orphans, reclaimed)
+
+    return scanned, orphans, reclaimed
+
+
+# Release image files once the current transaction commits, when the rows
+# that referenced them are gone for good
+def _release_on_commit(names):
+    field = _image_field()
+    transaction.on_commit(lambda: field.storage.release(names, field))
+
+
+# Remember the image a recipe was loaded with, to release it once replaced.
+# Deferred images are left to `collect_garbage()`.
+@receiver(post_init, sender=Recipe)
+def recipe_loaded(sender, instance, **kwargs):
+    image = instance.__dict__.get('image')
+    instance._loaded_image = image if isinstance(image, str) else None
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_replaced(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+
+    loaded = getattr(instance, '_loaded_image', None)
+    instance._loaded_image = instance.image.name
+    if loaded and loaded != instance.image.name:
+        _release_on_commit([loaded])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    if instance.image:
+        _release_on_commit([instance.image.name])
+
+
+# Return the metadata of a recipe image, from a path or a file: its size,
+# dominant color and BlurHash placeholder. JPEG images are only decoded at
+# the smallest scale still larger than the thumbnail.
+def image_metadata(source):
+    with Image.open(source) as image:
+        width, height = image.size
+        image.draft('RGB', (PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+        if image.mode in ('RGBA', 'LA', 'PA') \
+                or 'transparency' in image.info:
+            # Transparent pixels show the background of the page
+            image = image.convert('RGBA')
+            image = Image.alpha_composite(
+                Image.new('RGBA', image.size, 'white'),
+                image
+            )
+        image = image.convert('RGB')
+        image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+
+    quantized = image.quantize(colors=8)
+    _, index = max(quantized.getcolors())
+    color = quantized.getpalette()[index * 3:index * 3 + 3]
+
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_color': '#{:02x}{:02x}{:02x}'.format(*color),
+        'image_placeholder': blurhash.encode(
+            image,
+            *((4, 3) if width >= height else (3, 4))
+        ),
+    }
+
+
+# Compute the metadata of images as they are uploaded, before the file is
+# stored, and clear it with the image. Images that cannot be read are
+# stored without metadata.
+@receiver(pre_save, sender=Recipe)
+def recipe_image_uploaded(sender, instance, raw=False, update_fields=None,
+                          **kwargs):
+    if raw or 'image' not in instance.__dict__:
+        return
+    if update_fields is not None and 'image' not in update_fields:
+        return
+
+    image = instance.image
+    if not image:
+        metadata = NO_IMAGE_METADATA
+    elif not image._committed:
+        try:
+            image.file.seek(0)
+            metadata = image_metadata(image.file)
+        except UNREADABLE_IMAGE_ERRORS:
+            metadata = NO_IMAGE_METADATA
+        finally:
+            image.file.seek(0)
+    else:
+        return
+
+    for name, value in metadata.items():
+        setattr(instance, name, value)
+
+
+# Version of an image in its URLs: the start of its content hash, or of its
+# uuid for images stored before the content addressed storage
+def image_version(name):
+    return os.path.splitext(os.path.basename(name))[0][:16]
+
+
+# Return a response sending the file at `path`, or a 304 when the client has
+# it already. With MEDIA_ACCEL_REDIRECT the response is empty and nginx
+# sends the file found at its internal `location`, handling range requests,
+# so the bytes never go through a worker. `immutable` files are cached for
+# a year.
+def file_response(request, path, location, content_type, max_age=3600,
+                  immutable=False):
+    stat = os.stat(path)
+    # Same format as the ETags of nginx
+    etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(stat.st_mtime),
+    )
+    if response is None:
+        if getattr(settings, 'MEDIA_ACCEL_REDIRECT', False):
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = location
+        else:
+            response = FileResponse(
+                open(path, 'rb'),
+                content_type=content_type,
+            )
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if immutable:
+        response['Cache-Control'] = \
+            f'private, max-age={365 * 24 * 3600}, immutable'
+    else:
+        response['Cache-Control'] = f'private, max-age={max_age}'
+
+    return response
+
+
+# Path of a rendition in the cache, relative to RENDITION_ROOT
+def rendition_name(source, width, image_format):
+    key = hashlib.sha256(f'{source}:{width}'.encode()).hexdigest()
+    ext = RENDITION_FORMATS[image_format][2]
+
+    return f'{key[:2]}/{key}.{ext}'
+
+
+# Resize the image at `source_path` to `width` pixels at most and save it to
+# `path`. JPEG images are decoded at the smallest scale still larger than
+# the rendition, then reduced by integer factors before the final resize.
+def render(source_path, path, width, image_format):
+    pillow_format = RENDITION_FORMATS[image_format][0]
+
+    with Image.open(source_path) as image:
+        if image.mode == 'P':
+            image = image.convert('RGBA')
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image.draft('RGB', (width, height))
+            image = image.resize(
+                (width, height),
+                Image.Resampling.LANCZOS,
+                reducing_gap=3.0,
+            )
+        if pillow_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, pillow_format, quality=85)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+# Return the path of a rendition of a recipe image, rendering it on a cache
+# miss. Hits refresh the modification time the eviction orders files by.
+def get_rendition(source_path, source, width, image_format):
+    name = rendition_name(source, width, image_format)
+    path = os.path.join(settings.RENDITION_ROOT, name)
+
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        render(source_path, path, width, image_format)
+        _written(os.path.getsize(path))
+
+    return name, path
+
+
+# Count the bytes added to the rendition cache and queue an eviction each
+# time a tenth of its maximum size was written
+def _written(size):
+    cache.add(RENDITION_WRITTEN_KEY, 0, None)
+    try:
+        written = cache.incr(RENDITION_WRITTEN_KEY, size)
+    except ValueError:
+        written = size
+
+    if written >= settings.RENDITION_CACHE_MAX_BYTES // 10:
+        cache.set(RENDITION_WRITTEN_KEY, 0, None)
+        evict_renditions.delay()
+
+
+# Delete the least recently used renditions until the cache is back under
+# 90% of RENDITION_CACHE_MAX_BYTES. Returns the number of files deleted.
+@jobs.task
+def evict_renditions():
+    root = settings.RENDITION_ROOT
+    os.makedirs(root, exist_ok=True)
+
+    # One eviction at a time, whatever the number of workers
+    with open(os.path.join(root, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        files = []
+        total = 0
+        for directory in os.scandir(root):
+            if not directory.is_dir(follow_symlinks=False):
+                continue
+            with os.scandir(directory.path) as entries:
+                for entry in entries:
+                    stat = entry.stat(follow_symlinks=False)
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+        target = settings.RENDITION_CACHE_MAX_BYTES * 9 // 10
+        deleted = 0
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            deleted += 1
+
+    return deleted
@@ -0,0 +1,145 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+from core import compression, profiling, routers
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+# Return a key identifying the client of a request, from its token or
+# session, or None for anonymous clients
+def _client_key(request):
+    credentials = request.META.get('HTTP_AUTHORIZATION') \
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+
+    if not credentials:
+        return None
+
+    digest = hashlib.sha256(credentials.encode()).hexdigest()
+    return f'core:primary-pin:{digest}'
+
+
+# Return a key identifying the address of the client of a request, pinned
+# by the writes of anonymous clients, like signing up or logging in, whose
+# next requests come with credentials
+def _address_key(request):
+    address = request.META.get('REMOTE_ADDR')
+
+    return f'core:primary-pin:address:{address}' if address else None
+
+
+# Let safe requests read from replicas, except for clients that wrote
+# recently: they are pinned to the primary for REPLICA_PIN_SECONDS so they
+# always read their own writes. Unsafe requests that only read, like batches
+# of reads, set `request.read_only` so as not to pin the client. Pins are
+# kept in the cache, which must be shared by the workers (CACHE_LOCATION)
+# for a client to stay pinned whichever worker serves it.
+class ReplicaRoutingMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        keys = [
+            key for key in (_client_key(request), _address_key(request))
+            if key is not None
+        ]
+        safe = request.method in SAFE_METHODS
+        pinned = bool(keys) and bool(cache.get_many(keys))
+        request.replica_pinned = pinned
+
+        token = routers.allow_replica_reads(safe and not pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.reset_replica_reads(token)
+
+        if not safe and keys and not getattr(request, 'read_only', False):
+            cache.set(
+                keys[0],
+                1,
+                getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+            )
+
+        return response
+
+
+# Compress the responses of compressible types with the preferred encoding
+# the client accepts among COMPRESSION_ENCODINGS, when COMPRESSION_MODE is
+# 'app'. With 'proxy' nginx compresses them instead, in gzip only.
+# Responses under COMPRESSION_MIN_SIZE bytes are sent as they are, streamed
+# ones are compressed chunk by chunk.
+class CompressionMiddleware:
+
+    def __init__(self, get_response):
+        if getattr(settings, 'COMPRESSION_MODE', 'app') != 'app':
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        self.encodings = getattr(
+            settings,
+            'COMPRESSION_ENCODINGS',
+            list(compression.COMPRESSORS)
+        )
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.has_header('Content-Encoding') \
+                or response.has_header('X-Accel-Redirect') \
+                or not compression.is_compressible(
+                    response.get('Content-Type', '')):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.negotiate(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''),
+            self.encodings
+        )
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compression.compress_stream(
+                response.streaming_content,
+                encoding
+            )
+            del response['Content-Length']
+        else:
+            content = compression.compress(response.content, encoding)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        response['Content-Encoding'] = encoding
+        # The compressed bytes differ from those the ETag was computed from
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+
+        return response
+
+
+# Trace the memory allocated by a sample of the requests, at
+# MEMORY_PROFILING_RATE, when it is above 0. See `core.profiling`.
+class MemoryProfilingMiddleware:
+
+    def __init__(self, get_response):
+        if getattr(settings, 'MEMORY_PROFILING_RATE', 0) <= 0:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling.should_sample():
+            return self.get_response(request)
+
+        return profiling.profile(request, self.get_response)
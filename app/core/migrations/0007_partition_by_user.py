@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import migrations
+
+from core import partitioning
+
+
+# Hash partition the recipe tables when DB_HASH_PARTITIONS is set. Tables
+# can also be partitioned later with the `partition_tables` command.
+def partition_tables(apps, schema_editor):
+    connection = schema_editor.connection
+
+    if connection.vendor == 'postgresql' and settings.DB_HASH_PARTITIONS:
+        partitioning.partition_tables(connection, settings.DB_HASH_PARTITIONS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_similarity'),
+    ]
+
+    operations = [
+        # Partitioned tables work with the ORM as they are, so going back
+        # leaves them partitioned
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# (index, table, column) of the indexes serving the `istartswith` searches
+# of the admin, which compare upper-cased values with LIKE 'PREFIX%'
+SEARCH_INDEXES = [
+    ('core_user_email_upper_idx', 'core_user', 'email'),
+    ('core_tag_name_upper_idx', 'core_tag', 'name'),
+    ('core_ingredient_name_upper_idx', 'core_ingredient', 'name'),
+    ('core_recipe_title_upper_idx', 'core_recipe', 'title'),
+]
+
+
+# Expression indexes with an operator class are specific to PostgreSQL
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} '
+            f'ON {table} (UPPER({column}) text_pattern_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for name, _, _ in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.0.10 on 2026-10-19 08:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Count the recipes of the existing users, with one grouped query
+def count_recipes(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    UserStats = apps.get_model('core', 'UserStats')
+
+    counts = Recipe.objects.values_list('user_id').annotate(
+        count=models.Count('id')
+    ).order_by()
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id, recipe_count=count)
+         for user_id, count in counts],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('recipe_count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 4.0.10 on 2026-10-19 09:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Give the existing tags, ingredients and recipes of each user positions
+# in their change sequence, so that full syncs, which return the rows past
+# position 0, include them
+def number_changes(apps, schema_editor):
+    UserStats = apps.get_model('core', 'UserStats')
+    positions = {}
+    recipe_counts = {}
+
+    for name in ('Tag', 'Ingredient', 'Recipe'):
+        model = apps.get_model('core', name)
+        rows = model.objects.order_by('user_id', 'id').values_list(
+            'user_id', 'id'
+        )
+        batch = []
+        for user_id, row_id in rows.iterator(chunk_size=2000):
+            positions[user_id] = positions.get(user_id, 0) + 1
+            if name == 'Recipe':
+                recipe_counts[user_id] = recipe_counts.get(user_id, 0) + 1
+            batch.append(model(id=row_id, change_seq=positions[user_id]))
+            if len(batch) == 1000:
+                model.objects.bulk_update(batch, ['change_seq'])
+                batch = []
+        model.objects.bulk_update(batch, ['change_seq'])
+
+    existing = set(UserStats.objects.values_list('user_id', flat=True))
+    UserStats.objects.bulk_update(
+        [UserStats(user_id=user_id, change_seq=position)
+         for user_id, position in positions.items()
+         if user_id in existing],
+        ['change_seq'],
+        batch_size=1000,
+    )
+    UserStats.objects.bulk_create(
+        [UserStats(
+            user_id=user_id,
+            recipe_count=recipe_counts.get(user_id, 0),
+            change_seq=position,
+        )
+         for user_id, position in positions.items()
+         if user_id not in existing],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_userstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('recipe', 'Recipe'), ('tag', 'Tag'), ('ingredient', 'Ingredient')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('change_seq', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='change_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='change_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='change_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='change_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='pruned_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'change_seq'], name='core_ingredient_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'change_seq'], name='core_recipe_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'change_seq'], name='core_tag_changes_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user', 'change_seq'], name='core_tombst_user_id_8c11dd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deleted_at'], name='core_tombst_deleted_51085d_idx'),
+        ),
+        migrations.RunPython(number_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-19 10:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_image_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='pantry_generation',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
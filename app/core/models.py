@@ -1,14 +1,18 @@
 import os.path
 import uuid
-from django.db import models
+from django.db import models, router, transaction
+from django.utils import timezone
 
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
     PermissionsMixin
 
 from django.conf import settings
 
+from core.storage import recipe_image_storage
 
-# Generate file path for new recipe image
+
+# Generate file path for new recipe image. The storage then names the file
+# by the hash of its content.
 def recipe_image_file_path(instance, filename):
     ext = filename.split('.')[-1]
     filename = f'{uuid.uuid4()}.{ext}'
@@ -53,8 +57,33 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "email"
 
 
+# Model whose changes clients can sync: every save moves its row to the end
+# of the change sequence of its user (see core.changes)
+class ChangeTrackedModel(models.Model):
+    updated_at = models.DateTimeField(auto_now=True)
+    change_seq = models.BigIntegerField(default=0)
+
+    # Saved in the transaction taking the change sequence position, which
+    # keeps the counter locked until the row commits
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+        indexes = [
+            models.Index(
+                fields=['user', 'change_seq'],
+                name='%(app_label)s_%(class)s_changes_idx',
+            ),
+        ]
+
+
 # Tag to be used for a recipe
-class Tag(models.Model):
+class Tag(ChangeTrackedModel):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -66,7 +95,7 @@ class Tag(models.Model):
 
 
 # Ingredient to be used in a recipe
-class Ingredient(models.Model):
+class Ingredient(ChangeTrackedModel):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -78,7 +107,7 @@ class Ingredient(models.Model):
 
 
 # Recipe object
-class Recipe(models.Model):
+class Recipe(ChangeTrackedModel):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -89,7 +118,136 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(
+        null=True,
+        upload_to=recipe_image_file_path,
+        storage=recipe_image_storage,
+        db_index=True,
+    )
+    # Computed from the image when it is uploaded (see core.media), so that
+    # clients can lay out and paint a placeholder before loading it
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    image_color = models.CharField(max_length=7, blank=True)
+    image_placeholder = models.CharField(max_length=64, blank=True)
 
     def __str__(self):
         return self.title
+
+
+# MinHash signature of the tags and ingredients of a recipe
+class RecipeSignature(models.Model):
+    recipe = models.OneToOneField(
+        'Recipe',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+    )
+    minhash = models.JSONField(default=list)
+
+
+# Locality-sensitive hashing bucket of one band of a recipe signature
+class RecipeBucket(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    recipe = models.ForeignKey(
+        'Recipe',
+        on_delete=models.CASCADE,
+        related_name='buckets',
+    )
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'band', 'bucket']),
+        ]
+
+
+# Counters of a user kept up to date as their data changes, so listings can
+# report totals without counting rows
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    recipe_count = models.BigIntegerField(default=0)
+    # Last position in the change sequence of the user, and the highest one
+    # of the tombstones pruned since
+    change_seq = models.BigIntegerField(default=0)
+    pruned_seq = models.BigIntegerField(default=0)
+    # Number of changes to the recipes and their ingredients, telling the
+    # workers when their pantry index of the user is out of date
+    pantry_generation = models.BigIntegerField(default=0)
+
+
+# Deletion of a recipe, tag or ingredient, kept for the clients to sync
+class Tombstone(models.Model):
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    KIND_CHOICES = (
+        (RECIPE, 'Recipe'),
+        (TAG, 'Tag'),
+        (INGREDIENT, 'Ingredient'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'change_seq']),
+            models.Index(fields=['deleted_at']),
+        ]
+
+
+# Background job stored in the database and run by the `run_worker` command
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    task = models.CharField(max_length=255)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', '-priority', 'run_at'],
+                name='core_job_claim_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.task} ({self.status})'
@@ -0,0 +1,181 @@
+from django.db.models import Exists, OuterRef
+
+from core.models import Ingredient, Recipe, RecipeBucket, RecipeSignature, \
+    Tag
+
+
+# (table, partition key) of the tables partitioned by hash, parents first.
+# The through tables have no user_id column: adding one would need custom
+# through models (changing `recipe.tags.add()`), so they are partitioned on
+# recipe_id, which keeps the rows of a recipe together.
+def partitioned_tables():
+    return [
+        (Tag._meta.db_table, 'user_id'),
+        (Ingredient._meta.db_table, 'user_id'),
+        (Recipe._meta.db_table, 'user_id'),
+        (Recipe.tags.through._meta.db_table, 'recipe_id'),
+        (Recipe.ingredients.through._meta.db_table, 'recipe_id'),
+    ]
+
+
+# (model, column, referenced model) of the foreign keys dropped when the
+# tables are partitioned
+def dropped_foreign_keys():
+    return [
+        (Recipe.tags.through, 'recipe_id', Recipe),
+        (Recipe.tags.through, 'tag_id', Tag),
+        (Recipe.ingredients.through, 'recipe_id', Recipe),
+        (Recipe.ingredients.through, 'ingredient_id', Ingredient),
+        (RecipeSignature, 'recipe_id', Recipe),
+        (RecipeBucket, 'recipe_id', Recipe),
+    ]
+
+
+# Delete the rows referencing recipes, tags or ingredients that no longer
+# exist, which no foreign key prevents once the tables are partitioned.
+# Returns the number of rows deleted by table.
+def sweep_orphans():
+    deleted = {}
+    for model, column, target in dropped_foreign_keys():
+        count, _ = model.objects.filter(
+            ~Exists(target.objects.filter(id=OuterRef(column)))
+        ).delete()
+        table = model._meta.db_table
+        deleted[table] = deleted.get(table, 0) + count
+
+    return deleted
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        'SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)',
+        [table]
+    )
+    row = cursor.fetchone()
+
+    return row is not None and row[0] == 'p'
+
+
+# Return the statements converting a table to one partitioned by hash of
+# `key`. `indexes` and `foreign_keys` are the definitions to recreate once
+# the old table, and the constraints referencing it, are dropped.
+# `sequence` is the serial sequence of the id column, None for identities.
+#
+# DROP TABLE ... CASCADE silently drops every foreign key referencing the
+# old table, and only the table's own are recreated: the foreign keys of
+# the through tables to the tag, ingredient and recipe tables, and those of
+# RecipeSignature and RecipeBucket to core_recipe, are gone for good, since
+# a partitioned table cannot be referenced by its id alone. The rows of
+# those tables are then deleted along with their recipes by Django's
+# on_delete handling, and by the raw deletes of core.deletion, only: the
+# rows other deletes leave behind are removed by `sweep_orphans`.
+def partition_statements(table, key, partitions, indexes=(),
+                         foreign_keys=(), sequence=None):
+    old = f'{table}_unpartitioned'
+
+    statements = [
+        f'ALTER TABLE {table} RENAME TO {old}',
+        f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS '
+        f'INCLUDING IDENTITY INCLUDING CONSTRAINTS INCLUDING STORAGE) '
+        f'PARTITION BY HASH ({key})',
+    ]
+    statements += [
+        f'CREATE TABLE {table}_p{remainder} PARTITION OF {table} '
+        f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})'
+        for remainder in range(partitions)
+    ]
+    statements.append(f'INSERT INTO {table} SELECT * FROM {old}')
+    if sequence:
+        statements.append(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+    else:
+        statements.append(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"(SELECT max(id) FROM {table}))"
+        )
+    statements += [
+        f'DROP TABLE {old} CASCADE',
+        f'ALTER TABLE {table} ADD PRIMARY KEY (id, {key})',
+    ]
+    statements += list(indexes)
+    statements += [
+        f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}'
+        for name, definition in foreign_keys
+    ]
+
+    return statements
+
+
+# Index definitions of a table, except for its primary key
+def _indexes(cursor, table):
+    cursor.execute(
+        'SELECT pg_get_indexdef(indexrelid) FROM pg_index '
+        'WHERE indrelid = %s::regclass AND NOT indisprimary',
+        [table]
+    )
+
+    return [row[0] for row in cursor.fetchall()]
+
+
+# Foreign keys of a table, except those to tables that get partitioned
+# since partitioned tables cannot be referenced by their id alone
+def _foreign_keys(cursor, table, partitioned):
+    cursor.execute(
+        'SELECT conname, pg_get_constraintdef(oid), confrelid::regclass::text '
+        'FROM pg_constraint WHERE conrelid = %s::regclass AND contype = %s',
+        [table, 'f']
+    )
+
+    return [
+        (name, definition)
+        for name, definition, target in cursor.fetchall()
+        if target not in partitioned
+    ]
+
+
+# Convert the recipe tables to tables hash partitioned in `partitions`
+# partitions, skipping the ones that already are. Returns converted tables.
+def partition_tables(connection, partitions):
+    tables = partitioned_tables()
+    names = {table for table, _ in tables}
+    converted = []
+
+    with connection.cursor() as cursor:
+        for table, key in tables:
+            if is_partitioned(cursor, table):
+                continue
+
+            cursor.execute(
+                "SELECT pg_get_serial_sequence(%s, 'id')",
+                [table]
+            )
+            sequence = cursor.fetchone()[0]
+
+            statements = partition_statements(
+                table,
+                key,
+                partitions,
+                indexes=_indexes(cursor, table),
+                foreign_keys=_foreign_keys(cursor, table, names),
+                sequence=sequence,
+            )
+            for statement in statements:
+                cursor.execute(statement)
+
+            converted.append(table)
+
+    return converted
+
+
+# Return the names of the relations scanned by an EXPLAIN (FORMAT JSON) plan
+def scanned_relations(plan):
+    if isinstance(plan, list):
+        plan = plan[0]
+    node = plan.get('Plan', plan)
+
+    relations = []
+    if 'Relation Name' in node:
+        relations.append(node['Relation Name'])
+    for child in node.get('Plans', []):
+        relations += scanned_relations(child)
+
+    return relations
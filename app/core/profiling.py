@@ -0,0 +1,145 @@
+import os
+import random
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+from django.conf import settings
+
+_lock = threading.Lock()
+# Most recent samples, and totals by action, of the current worker
+_samples = deque()
+_actions = {}
+
+# Files whose allocations are the profiler's own, left out of the samples
+IGNORED_FILES = (tracemalloc.__file__, __file__)
+
+
+# Return the name of the view action serving a request, like
+# `RecipeViewSet.list`, or None when it was not resolved
+def action_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+
+    view = getattr(match.func, 'cls', None)
+    if view is None:
+        return match.view_name
+
+    method = request.method.lower()
+    actions = getattr(match.func, 'actions', None)
+    if actions:
+        return f'{view.__name__}.{actions.get(method, method)}'
+
+    return f'{view.__name__}.{method}'
+
+
+# Whether to profile the next request, at MEMORY_PROFILING_RATE
+def should_sample():
+    rate = getattr(settings, 'MEMORY_PROFILING_RATE', 0)
+
+    return rate > 0 and random.random() < rate
+
+
+# Run `get_response` with allocations traced and record the memory its
+# request allocated and still held at the end, peak memory and top
+# allocation sites. Tracing is process wide: requests served concurrently
+# by other threads are counted too, and slowed down several times like the
+# profiled one, hence the sampling. Returns the response.
+def profile(request, get_response):
+    with _lock:
+        if tracemalloc.is_tracing():
+            # Another request is being profiled
+            return get_response(request)
+        tracemalloc.start(getattr(settings, 'MEMORY_PROFILING_FRAMES', 5))
+
+    started = time.time()
+    try:
+        response = get_response(request)
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Snapshots are summed up once the response was sent
+    action = action_name(request) or request.path_info
+    response._resource_closers.append(
+        lambda: record(action, request, snapshot, peak, started)
+    )
+
+    return response
+
+
+# Add a sample to the buffer of the current worker, dropping the oldest
+# past MEMORY_PROFILING_BUFFER samples
+def record(action, request, snapshot, peak, started):
+    # Grouped before filtering: filtering the traces one by one in Python
+    # would cost more than the request
+    statistics = [
+        stat for stat in snapshot.statistics('traceback')
+        if stat.traceback[-1].filename not in IGNORED_FILES
+    ]
+    retained = sum(stat.size for stat in statistics)
+    top = getattr(settings, 'MEMORY_PROFILING_TOP', 10)
+
+    sample = {
+        'action': action,
+        'method': request.method,
+        'path': request.path_info,
+        'started': started,
+        'retained_bytes': retained,
+        'peak_bytes': peak,
+        'sites': [
+            {
+                'size': stat.size,
+                'count': stat.count,
+                # Oldest frame first, the allocating line last
+                'traceback': [
+                    f'{frame.filename}:{frame.lineno}'
+                    for frame in stat.traceback
+                ],
+            }
+            for stat in statistics[:top]
+        ],
+    }
+
+    size = getattr(settings, 'MEMORY_PROFILING_BUFFER', 100)
+    with _lock:
+        _samples.append(sample)
+        while len(_samples) > size:
+            _samples.popleft()
+
+        totals = _actions.setdefault(action, {
+            'requests': 0,
+            'retained_bytes': 0,
+            'max_peak_bytes': 0,
+        })
+        totals['requests'] += 1
+        totals['retained_bytes'] += retained
+        totals['max_peak_bytes'] = max(totals['max_peak_bytes'], peak)
+
+
+# Return the samples and totals by action of the current worker, the
+# actions holding the most memory first
+def report():
+    with _lock:
+        samples = list(_samples)
+        actions = {action: dict(totals) for action, totals in
+                   _actions.items()}
+
+    return {
+        'pid': os.getpid(),
+        'rate': getattr(settings, 'MEMORY_PROFILING_RATE', 0),
+        'actions': dict(sorted(
+            actions.items(),
+            key=lambda item: -item[1]['retained_bytes']
+        )),
+        'samples': samples[::-1],
+    }
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _actions.clear()
@@ -0,0 +1,96 @@
+import contextvars
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+# Set for the duration of requests allowed to read from a replica
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+_lag_cache = {}
+_lag_lock = threading.Lock()
+
+LAG_QUERY = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+'''
+
+
+# Allow (or forbid) reads of the current context to go to a replica and
+# return a token to restore the previous state
+def allow_replica_reads(allowed=True):
+    return _replica_reads.set(allowed)
+
+
+def reset_replica_reads(token):
+    _replica_reads.reset(token)
+
+
+# Return the replication lag of a replica in seconds, checked at most once
+# per REPLICA_LAG_CHECK_INTERVAL by each worker. An unreachable replica
+# has an infinite lag.
+def replica_lag(alias):
+    now = time.monotonic()
+    interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 1)
+
+    with _lag_lock:
+        checked_at, lag = _lag_cache.get(alias, (None, None))
+    if checked_at is not None and now - checked_at < interval:
+        return lag
+
+    connection = connections[alias]
+    try:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_QUERY)
+                lag = float(cursor.fetchone()[0] or 0)
+        else:
+            lag = 0.0
+    except DatabaseError:
+        lag = float('inf')
+
+    with _lag_lock:
+        _lag_cache[alias] = (now, lag)
+
+    return lag
+
+
+# Send safe-method reads to a replica that is not lagging behind, and
+# everything else to the primary database
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+
+        if not replicas or not _replica_reads.get():
+            return 'default'
+
+        # Reads inside a transaction must see its own writes
+        if connections['default'].in_atomic_block:
+            return 'default'
+
+        max_lag = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 2)
+        healthy = [
+            alias for alias in replicas if replica_lag(alias) <= max_lag
+        ]
+
+        return random.choice(healthy) if healthy else 'default'
+
+    # Reads of the rest of the request go to the primary too once it wrote,
+    # so that they see the write
+    def db_for_write(self, model, **hints):
+        if _replica_reads.get():
+            _replica_reads.set(False)
+
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,35 @@
+from django.conf import settings
+from rest_framework import serializers
+
+from core.batch import SAFE_METHODS
+
+
+# Serializer for a request of a batch
+class SubRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(
+        choices=SAFE_METHODS + ('POST', 'PUT', 'PATCH', 'DELETE'),
+        default='GET'
+    )
+    path = serializers.CharField()
+    body = serializers.JSONField(default=None, allow_null=True)
+
+    # Only API endpoints can be batched
+    def validate_path(self, value):
+        if not value.startswith('/api/'):
+            raise serializers.ValidationError('Must start with /api/.')
+
+        return value
+
+
+# Serializer for a batch of requests
+class BatchSerializer(serializers.Serializer):
+    requests = SubRequestSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        max_requests = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+        if len(value) > max_requests:
+            raise serializers.ValidationError(
+                f'Ensure there are at most {max_requests} requests.'
+            )
+
+        return value
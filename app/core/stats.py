@@ -0,0 +1,53 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Recipe, User, UserStats
+
+
+# Return the counters of a user, created from a count for the users who
+# have none yet
+def _get_stats(user_id):
+    stats, created = UserStats.objects.get_or_create(
+        user_id=user_id,
+        defaults={
+            'recipe_count': lambda: Recipe.objects.filter(
+                user_id=user_id
+            ).count(),
+        }
+    )
+
+    return stats, created
+
+
+# Add `delta` to the recipe count of a user, in the transaction changing
+# the recipes
+def _add_recipes(user_id, delta):
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        recipe_count=F('recipe_count') + delta
+    )
+    if not updated and not _get_stats(user_id)[1]:
+        # Created concurrently from a count that may miss this change
+        _add_recipes(user_id, delta)
+
+
+# Return the number of recipes of a user
+def recipe_count(user_id):
+    return _get_stats(user_id)[0].recipe_count
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        _add_recipes(instance.user_id, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    _add_recipes(instance.user_id, -1)
@@ -0,0 +1,161 @@
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import StaticFilesStorage
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from core import compression
+
+# Names of the files stored by content: <dir>/<2 first hex>/<sha256>.<ext>
+CONTENT_NAME = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}(\.\w+)?$')
+
+
+# Return the sha256 hex digest of a file, reading it by chunks
+def content_hash(content):
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+
+    return digest.hexdigest()
+
+
+# Return the name under which a file is stored by content, in the directory
+# of `name` and with its extension
+def content_name(name, digest):
+    ext = os.path.splitext(name)[1].lower()
+
+    return os.path.join(
+        os.path.dirname(name),
+        digest[:2],
+        f'{digest}{ext}'
+    )
+
+
+def is_content_name(name):
+    return CONTENT_NAME.search(name) is not None
+
+
+# File system storage naming files by the hash of their content, so that
+# identical uploads share a single file. A file is shared by every row
+# referencing its name: use `release()` rather than `delete()` to remove it
+# once it may not be referenced anymore.
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = content_name(name, content_hash(content))
+
+        return super().save(name, content, max_length=max_length)
+
+    # The name depends on the content only: an existing file with the same
+    # name is the same file and is reused rather than renamed
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            # Refresh the modification time so a concurrent `release()`
+            # sees the file as in use
+            os.utime(full_path)
+            return name
+
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+
+        # Write to a temporary file then link it in place, so that readers
+        # never see a partial file and concurrent uploads of the same
+        # content both succeed
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            try:
+                os.link(tmp_path, full_path)
+            except FileExistsError:
+                pass
+        finally:
+            os.remove(tmp_path)
+
+        return name
+
+    # Delete the files of `names` that no row of `field` references any
+    # more. Files written or reused within MEDIA_RELEASE_GRACE_SECONDS are
+    # kept since a row referencing them may not be committed yet.
+    def release(self, names, field):
+        names = {name for name in names if name}
+        if not names:
+            return []
+
+        model = field.model
+        referenced = set(
+            model._base_manager
+            .filter(**{f'{field.name}__in': names})
+            .values_list(field.name, flat=True)
+            .distinct()
+        )
+        grace = getattr(settings, 'MEDIA_RELEASE_GRACE_SECONDS', 60)
+        recent = time.time() - grace
+
+        deleted = []
+        for name in sorted(names - referenced):
+            try:
+                if os.path.getmtime(self.path(name)) > recent:
+                    continue
+            except FileNotFoundError:
+                continue
+            self.delete(name)
+            deleted.append(name)
+
+        return deleted
+
+
+# Static files storage writing a gzip copy of the compressible files it
+# collects next to them, for nginx's gzip_static, at the highest level since
+# it is done once per deployment
+class CompressedStaticFilesStorage(StaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+
+        min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        for name in paths:
+            content_type = mimetypes.guess_type(name)[0] or ''
+            if not compression.is_compressible(content_type) \
+                    or self.size(name) < min_size:
+                continue
+
+            with self.open(name) as f:
+                data = f.read()
+            compressed = compression.compress(data, 'gzip', 9)
+            if len(compressed) >= len(data):
+                continue
+
+            with open(self.path(name) + '.gz', 'wb') as f:
+                f.write(compressed)
+            yield name, name + '.gz', True
+
+
+recipe_image_storage = ContentAddressedStorage()
@@ -1,7 +1,13 @@
+from django.contrib.admin.widgets import AutocompleteMixin
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core.counting import estimated_count
+from core.models import Recipe
+
 
 class AdminSiteTests(TestCase):
 
@@ -39,3 +45,87 @@ class AdminSiteTests(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+
+# Test the admin of the recipe tables
+class LargeTableAdminTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email='admin@imran.ma',
+            password='password123',
+        )
+        self.client.force_login(self.admin_user)
+        for i in range(5):
+            Recipe.objects.create(
+                user=self.admin_user,
+                title=f'Recipe {i}',
+                time_minutes=5,
+                price=1,
+            )
+
+    # Test that pages load their rows by primary key in order
+    def test_recipes_listed(self):
+        url = reverse('admin:core_recipe_changelist')
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url)
+        Recipe.objects.create(
+            user=get_user_model().objects.create_user('other@imran.ma'),
+            title='Recipe 5',
+            time_minutes=5,
+            price=1,
+        )
+        with self.assertNumQueries(len(queries)):
+            self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        titles = [recipe.title for recipe in res.context['cl'].result_list]
+        self.assertEqual(titles, [f'Recipe {i}' for i in range(4, -1, -1)])
+
+    # Test that recipes are searched by the start of their title
+    def test_recipes_search(self):
+        url = reverse('admin:core_recipe_changelist')
+
+        Recipe.objects.create(
+            user=self.admin_user,
+            title='Pancakes',
+            time_minutes=5,
+            price=1,
+        )
+
+        res = self.client.get(url, {'q': 'pan'})
+
+        self.assertEqual(res.context['cl'].result_count, 1)
+
+    # Test that the counts past the threshold are estimated
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=3)
+    def test_estimated_count(self):
+        count, estimated = estimated_count(Recipe.objects.all())
+
+        if connection.vendor == 'postgresql':
+            self.assertTrue(estimated)
+            self.assertGreaterEqual(count, 3)
+        else:
+            self.assertEqual((count, estimated), (5, False))
+
+        self.assertEqual(
+            estimated_count(Recipe.objects.filter(title='Recipe 1')),
+            (1, False)
+        )
+
+    # Test that the recipe change page uses autocomplete widgets
+    def test_recipe_change_page(self):
+        recipe = Recipe.objects.first()
+        url = reverse('admin:core_recipe_change', args=[recipe.id])
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        fields = res.context['adminform'].form.fields
+        for name in ('user', 'tags', 'ingredients'):
+            self.assertIsInstance(
+                fields[name].widget.widget,
+                AutocompleteMixin
+            )
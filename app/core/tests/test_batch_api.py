@@ -0,0 +1,215 @@
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import exceptions, status
+from rest_framework.test import APIClient
+
+from core import batch
+from core.models import Ingredient, Tag
+
+BATCH_URL = reverse('core:batch')
+
+
+def sub_request(path, method='GET', body=None):
+    return {'method': method, 'path': path, 'body': body}
+
+
+# Test the batch API
+class BatchApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123',
+            name='Imran'
+        )
+        self.client.force_authenticate(self.user)
+
+    def run_batch(self, *requests):
+        res = self.client.post(
+            BATCH_URL,
+            {'requests': list(requests)},
+            format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return res.data['responses']
+
+    # Test that authentication is required
+    def test_auth_required(self):
+        res = APIClient().post(
+            BATCH_URL,
+            {'requests': [sub_request('/api/user/me/')]},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    # Test that the requests of a batch run as the authenticated user
+    def test_startup_batch(self):
+        Tag.objects.create(user=self.user, name='Vegan')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        other = get_user_model().objects.create_user('other@imran.ma')
+        Tag.objects.create(user=other, name='Other')
+
+        me, tags, ingredients, recipes = self.run_batch(
+            sub_request('/api/user/me/'),
+            sub_request('/api/recipe/tags/'),
+            sub_request('/api/recipe/ingredients/?fields=name'),
+            sub_request('/api/recipe/recipes/'),
+        )
+
+        self.assertEqual(me['status'], status.HTTP_200_OK)
+        self.assertEqual(me['body']['email'], self.user.email)
+        self.assertEqual([tag['name'] for tag in tags['body']], ['Vegan'])
+        self.assertEqual(
+            ingredients['body'],
+            [{'id': salt.id, 'name': 'Salt'}]
+        )
+        self.assertEqual(recipes['body'], [])
+
+    # Test that writes run in order with the reads around them
+    def test_writes_in_order(self):
+        before, created, invalid, after = self.run_batch(
+            sub_request('/api/recipe/tags/'),
+            sub_request('/api/recipe/tags/', 'POST', {'name': 'Vegan'}),
+            sub_request('/api/recipe/tags/', 'POST', {'name': ''}),
+            sub_request('/api/recipe/tags/'),
+        )
+
+        self.assertEqual(before['body'], [])
+        self.assertEqual(created['status'], status.HTTP_201_CREATED)
+        self.assertEqual(invalid['status'], status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(after['body'], [created['body']])
+
+    # Test that a failed write is rolled back alone
+    def test_failed_write_rolled_back(self):
+        def create_then_fail(serializer):
+            serializer.save(user=self.user)
+            raise exceptions.ValidationError('Rejected')
+
+        with patch(
+            'recipe.views.BaseRecipeAttrViewSet.perform_create',
+            side_effect=create_then_fail
+        ):
+            failed = self.run_batch(
+                sub_request('/api/recipe/tags/', 'POST', {'name': 'Vegan'})
+            )[0]
+        created = self.run_batch(
+            sub_request('/api/recipe/tags/', 'POST', {'name': 'Keto'})
+        )[0]
+
+        self.assertEqual(failed['status'], status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(created['status'], status.HTTP_201_CREATED)
+        self.assertEqual(
+            list(Tag.objects.values_list('name', flat=True)),
+            ['Keto']
+        )
+
+    # Test that requests that cannot be dispatched fail on their own
+    def test_failed_requests(self):
+        missing, nested, ok = self.run_batch(
+            sub_request('/api/missing/'),
+            sub_request('/api/batch/', 'POST', {'requests': []}),
+            sub_request('/api/user/me/'),
+        )
+
+        self.assertEqual(missing['status'], status.HTTP_404_NOT_FOUND)
+        self.assertEqual(nested['status'], status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(ok['status'], status.HTTP_200_OK)
+
+    # Test that an error in a view is returned as a 500 of its request
+    def test_server_error(self):
+        with patch(
+            'user.views.ManageUserView.get_object',
+            side_effect=RuntimeError
+        ), self.assertLogs('core.batch', 'ERROR'):
+            error, ok = self.run_batch(
+                sub_request('/api/user/me/'),
+                sub_request('/api/recipe/tags/'),
+            )
+
+        self.assertEqual(error['status'], 500)
+        self.assertEqual(ok['status'], status.HTTP_200_OK)
+
+    # Test that invalid batches are rejected
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_invalid_batches(self):
+        batches = [
+            [],
+            [sub_request('/admin/')],
+            [sub_request('/api/user/me/', 'TRACE')],
+            [sub_request('/api/user/me/')] * 3,
+        ]
+
+        for requests in batches:
+            res = self.client.post(
+                BATCH_URL,
+                {'requests': requests},
+                format='json'
+            )
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # Test that batches of reads do not pin the client to the primary
+    def test_read_only_batch_not_pinned(self):
+        cache.clear()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token abc')
+        client.force_authenticate(self.user)
+
+        with patch('core.middleware.cache.set') as pin:
+            client.post(
+                BATCH_URL,
+                {'requests': [sub_request('/api/user/me/')]},
+                format='json'
+            )
+            pin.assert_not_called()
+
+            client.post(
+                BATCH_URL,
+                {'requests': [sub_request(
+                    '/api/recipe/tags/', 'POST', {'name': 'Vegan'}
+                )]},
+                format='json'
+            )
+            pin.assert_called_once()
+
+
+# Test that the reads of a batch run concurrently
+@override_settings(BATCH_MAX_WORKERS=4)
+class BatchConcurrencyTests(TransactionTestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('user@imran.ma')
+        self.client.force_authenticate(self.user)
+        Tag.objects.create(user=self.user, name='Vegan')
+
+    # Test that consecutive reads run on several threads
+    def test_reads_run_concurrently(self):
+        threads = set()
+        dispatch = batch.dispatch
+
+        def record(*args, **kwargs):
+            threads.add(threading.get_ident())
+            return dispatch(*args, **kwargs)
+
+        with patch('core.batch.dispatch', side_effect=record):
+            res = self.client.post(
+                BATCH_URL,
+                {'requests': [sub_request('/api/recipe/tags/')] * 4},
+                format='json'
+            )
+
+        responses = res.data['responses']
+        self.assertEqual(
+            [response['body'][0]['name'] for response in responses],
+            ['Vegan'] * 4
+        )
+        self.assertNotIn(threading.get_ident(), threads)
@@ -0,0 +1,128 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core import compression
+from core.middleware import CompressionMiddleware
+from core.storage import CompressedStaticFilesStorage
+
+PAYLOAD = json.dumps(
+    [{'id': i, 'title': f'Recipe {i}'} for i in range(200)]
+).encode()
+
+
+def respond(response, accept_encoding='gzip'):
+    request = RequestFactory().get(
+        '/api/recipe/recipes/',
+        HTTP_ACCEPT_ENCODING=accept_encoding
+    )
+
+    return CompressionMiddleware(lambda request: response)(request)
+
+
+@override_settings(
+    COMPRESSION_MODE='app',
+    COMPRESSION_ENCODINGS=['zstd', 'br', 'gzip'],
+    COMPRESSION_MIN_SIZE=1024,
+)
+class CompressionMiddlewareTests(SimpleTestCase):
+
+    # Test that the preferred encoding with the best quality is picked
+    def test_negotiate(self):
+        encodings = ['br', 'gzip']
+
+        self.assertEqual(
+            compression.negotiate('gzip, deflate', encodings), 'gzip'
+        )
+        self.assertEqual(compression.negotiate('gzip;q=0', encodings), None)
+        self.assertEqual(compression.negotiate('', encodings), None)
+        if 'br' in compression.COMPRESSORS:
+            self.assertEqual(
+                compression.negotiate('gzip, br', encodings), 'br'
+            )
+            self.assertEqual(
+                compression.negotiate('gzip, br;q=0.5', encodings), 'gzip'
+            )
+            self.assertEqual(compression.negotiate('*', encodings), 'br')
+
+    # Test that large JSON responses are compressed
+    def test_compress_json(self):
+        response = respond(
+            HttpResponse(PAYLOAD, content_type='application/json')
+        )
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(response.content), PAYLOAD)
+
+    # Test that small responses and images are left alone
+    def test_not_compressed(self):
+        small = respond(HttpResponse(b'{}', content_type='application/json'))
+        image = respond(HttpResponse(PAYLOAD, content_type='image/jpeg'))
+
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertFalse(image.has_header('Content-Encoding'))
+
+    # Test that streamed responses are compressed chunk by chunk
+    def test_compress_streaming(self):
+        chunks = [PAYLOAD[i:i + 100] for i in range(0, len(PAYLOAD), 100)]
+        response = respond(StreamingHttpResponse(
+            iter(chunks),
+            content_type='application/json'
+        ))
+
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)),
+            PAYLOAD
+        )
+
+    # Test that zstd is preferred when accepted
+    @unittest.skipUnless('zstd' in compression.COMPRESSORS, 'No zstandard')
+    def test_compress_zstd(self):
+        import zstandard
+
+        response = respond(
+            HttpResponse(PAYLOAD, content_type='application/json'),
+            'gzip, br, zstd'
+        )
+
+        self.assertEqual(response['Content-Encoding'], 'zstd')
+        self.assertEqual(
+            zstandard.ZstdDecompressor().decompressobj().decompress(
+                response.content
+            ),
+            PAYLOAD
+        )
+
+    # Test that the middleware is disabled when nginx compresses
+    @override_settings(COMPRESSION_MODE='proxy')
+    def test_proxy_mode(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            CompressionMiddleware(lambda request: None)
+
+
+class CompressedStaticFilesStorageTests(SimpleTestCase):
+
+    # Test that collected text files get a gzip copy
+    def test_post_process(self):
+        location = tempfile.mkdtemp()
+        for name, content in (('app.js', PAYLOAD), ('logo.png', PAYLOAD),
+                              ('small.css', b'a {}')):
+            with open(os.path.join(location, name), 'wb') as f:
+                f.write(content)
+        storage = CompressedStaticFilesStorage(location=location)
+
+        processed = list(storage.post_process(
+            {name: (storage, name)
+             for name in ('app.js', 'logo.png', 'small.css')}
+        ))
+
+        self.assertEqual(processed, [('app.js', 'app.js.gz', True)])
+        with gzip.open(os.path.join(location, 'app.js.gz')) as f:
+            self.assertEqual(f.read(), PAYLOAD)
@@ -0,0 +1,92 @@
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.deletion import purge_user
+from core.models import Ingredient, Recipe, Tag
+from core.partitioning import sweep_orphans
+
+
+def create_user(email):
+    return get_user_model().objects.create_user(email, 'testpass')
+
+
+def create_recipes(user, count):
+    tag = Tag.objects.create(user=user, name='Vegan')
+    ingredient = Ingredient.objects.create(user=user, name='Salt')
+    for i in range(count):
+        recipe = Recipe.objects.create(
+            user=user,
+            title=f'Recipe {i}',
+            time_minutes=5,
+            price=1,
+        )
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    MEDIA_RELEASE_GRACE_SECONDS=0,
+)
+class PurgeUserTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user('purged@imran.ma')
+        self.other = create_user('kept@imran.ma')
+        create_recipes(self.user, 5)
+        create_recipes(self.other, 2)
+
+    # Test that purging deletes the data of the user only, in batches
+    def test_purge_user(self):
+        steps = []
+
+        purge_user(
+            self.user.id,
+            batch_size=2,
+            progress=lambda step, count: steps.append((step, count)),
+        )
+
+        self.assertFalse(
+            get_user_model().objects.filter(id=self.user.id).exists()
+        )
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+        self.assertFalse(Tag.objects.filter(user=self.user).exists())
+        self.assertEqual(Recipe.objects.filter(user=self.other).count(), 2)
+        self.assertEqual(
+            Recipe.tags.through.objects.filter(
+                recipe__user=self.other
+            ).count(),
+            2
+        )
+        self.assertEqual(
+            [count for step, count in steps if step == 'recipes'],
+            [2, 4, 5]
+        )
+        # Nothing is left for the foreign keys of unpartitioned tables
+        self.assertFalse(any(sweep_orphans().values()))
+
+    # Test that the image files of the recipes are deleted
+    def test_purge_user_images(self):
+        recipe = Recipe.objects.filter(user=self.user).first()
+        recipe.image.save('photo.jpg', ContentFile(b'image'))
+        name = recipe.image.name
+
+        purge_user(self.user.id)
+
+        self.assertFalse(recipe.image.storage.exists(name))
+
+    # Test the command deleting a user
+    def test_purge_user_command(self):
+        out = StringIO()
+
+        call_command('purge_user', 'purged@imran.ma', stdout=out)
+
+        self.assertIn('5 recipes deleted', out.getvalue())
+        self.assertFalse(
+            get_user_model().objects.filter(id=self.user.id).exists()
+        )
@@ -0,0 +1,79 @@
+import tempfile
+import time
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import identify_hasher
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.hashers import VerificationBusy, verification_slot
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class TunableHasherTests(TestCase):
+
+    # Test that passwords are hashed with the configured iterations
+    def test_iterations_setting(self):
+        user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertEqual(
+            type(identify_hasher(user.password)).__name__,
+            'TunablePBKDF2PasswordHasher'
+        )
+
+    # Test that passwords are rehashed on login when the setting changed
+    def test_rehash_on_login(self):
+        get_user_model().objects.create_user('user@imran.ma', 'password123')
+
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            user = authenticate(email='user@imran.ma', password='password123')
+
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+
+
+class VerificationSlotTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            PASSWORD_HASH_CONCURRENCY=2,
+            PASSWORD_HASH_LOCK_DIR=self.directory.name
+        )
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        self.directory.cleanup()
+
+    # Test that at most PASSWORD_HASH_CONCURRENCY slots are held at once
+    def test_slots_bounded(self):
+        with verification_slot(), verification_slot():
+            with self.assertRaises(VerificationBusy):
+                with verification_slot(timeout=0.05):
+                    pass
+
+        with verification_slot(timeout=0):
+            pass
+
+    # Test that logins do not wait for a slot by default
+    def test_fail_fast_by_default(self):
+        with override_settings(PASSWORD_HASH_CONCURRENCY=1), \
+                verification_slot():
+            start = time.monotonic()
+            with self.assertRaises(VerificationBusy):
+                with verification_slot():
+                    pass
+            self.assertLess(time.monotonic() - start, 0.05)
+
+    # Test that a slot is released when the verification fails
+    def test_slot_released_on_error(self):
+        with override_settings(PASSWORD_HASH_CONCURRENCY=1):
+            with self.assertRaises(ValueError), verification_slot():
+                raise ValueError
+
+            with verification_slot(timeout=0):
+                pass
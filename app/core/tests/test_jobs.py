@@ -0,0 +1,126 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+calls = []
+
+
+@jobs.task
+def record_call(value):
+    calls.append(value)
+
+
+@jobs.task(max_attempts=2)
+def always_fail():
+    raise RuntimeError('Boom')
+
+
+@override_settings(JOB_RETRY_DELAY=10)
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    # Test that a delayed task is run by the worker
+    def test_worker_runs_jobs(self):
+        job = record_call.delay('hello')
+
+        call_command('run_worker', '--burst', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(calls, ['hello'])
+
+    # Test that jobs are claimed by priority, then by due date
+    def test_claim_order(self):
+        low = jobs.enqueue(record_call.task_name, ['low'])
+        high = jobs.enqueue(record_call.task_name, ['high'], priority=5)
+        jobs.enqueue(
+            record_call.task_name,
+            ['later'],
+            run_at=timezone.now() + timedelta(hours=1),
+        )
+
+        self.assertEqual(jobs.claim(5), [high.id, low.id])
+        self.assertEqual(jobs.claim(5), [])
+
+    # Test that failed jobs are retried with a backoff, then given up
+    def test_failed_job_retried(self):
+        job = always_fail.delay()
+
+        jobs.execute(jobs.claim()[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('Boom', job.last_error)
+        self.assertEqual(jobs.claim(), [])
+
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        jobs.execute(jobs.claim()[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    # Test that jobs abandoned by a dead worker are claimed again
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_abandoned_job_claimed_again(self):
+        job = record_call.delay('again')
+        self.assertEqual(jobs.claim(), [job.id])
+        self.assertEqual(jobs.claim(), [])
+
+        Job.objects.filter(id=job.id).update(
+            locked_at=timezone.now() - timedelta(minutes=5)
+        )
+
+        self.assertEqual(jobs.claim(), [job.id])
+
+    # Test that abandoned jobs without attempts left are failed
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_abandoned_job_exhausted(self):
+        job = jobs.enqueue(record_call.task_name, ['crash'], max_attempts=1)
+        self.assertEqual(jobs.claim(), [job.id])
+
+        Job.objects.filter(id=job.id).update(
+            locked_at=timezone.now() - timedelta(minutes=5)
+        )
+
+        self.assertEqual(jobs.claim(), [])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNone(job.locked_at)
+        self.assertIn('Abandoned', job.last_error)
+
+    # Test that done jobs are pruned after the retention period only
+    def test_prune_jobs(self):
+        old = record_call.delay('old')
+        recent = record_call.delay('recent')
+        failed = jobs.enqueue('os.getcwd', max_attempts=1)
+        jobs.execute(jobs.claim()[0])
+        jobs.execute(jobs.claim()[0])
+        jobs.execute(jobs.claim()[0])
+        Job.objects.exclude(id=recent.id).update(
+            run_at=timezone.now() - timedelta(days=10)
+        )
+
+        out = StringIO()
+        call_command('prune_jobs', '--days', '7', stdout=out)
+
+        self.assertIn('1 jobs pruned', out.getvalue())
+        self.assertFalse(Job.objects.filter(id=old.id).exists())
+        self.assertTrue(Job.objects.filter(id=recent.id).exists())
+        self.assertTrue(Job.objects.filter(id=failed.id).exists())
+
+    # Test that unknown tasks fail instead of running arbitrary code
+    def test_unregistered_task_fails(self):
+        job = jobs.enqueue('os.getcwd', max_attempts=1)
+
+        self.assertEqual(jobs.execute(jobs.claim()[0]), Job.FAILED)
+        job.refresh_from_db()
+        self.assertIn('not a registered task', job.last_error)
@@ -0,0 +1,246 @@
+import io
+import os
+import tempfile
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from core.media import evict_renditions, image_metadata
+from core.models import Recipe
+
+
+def sample_recipe(user):
+    return Recipe.objects.create(
+        user=user,
+        title='Recipe',
+        time_minutes=5,
+        price=1,
+    )
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    MEDIA_RELEASE_GRACE_SECONDS=0,
+)
+class MediaCleanupTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+        self.storage = Recipe._meta.get_field('image').storage
+
+    def write_file(self, name, age=0):
+        path = self.storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'orphan')
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+
+    # Test that the collector deletes old unreferenced files only
+    def test_gc_media(self):
+        recipe = sample_recipe(self.user)
+        recipe.image.save('kept.jpg', ContentFile(b'kept'))
+        os.utime(self.storage.path(recipe.image.name), (0, 0))
+        self.write_file('uploads/recipe/ab/old.jpg', age=7200)
+        self.write_file('uploads/recipe/new.jpg')
+
+        out = StringIO()
+        call_command('gc_media', '--dry-run', stdout=out)
+
+        self.assertIn('1 orphaned files found out of 3', out.getvalue())
+        self.assertTrue(self.storage.exists('uploads/recipe/ab/old.jpg'))
+
+        call_command('gc_media', '--batch-size', '1', stdout=StringIO())
+
+        self.assertFalse(self.storage.exists('uploads/recipe/ab/old.jpg'))
+        self.assertTrue(self.storage.exists('uploads/recipe/new.jpg'))
+        self.assertTrue(self.storage.exists(recipe.image.name))
+
+    # Test that a replaced image is deleted once no recipe uses it
+    def test_replaced_image_released(self):
+        recipe = sample_recipe(self.user)
+        other = sample_recipe(self.user)
+        recipe.image.save('first.jpg', ContentFile(b'first'))
+        other.image.save('first.jpg', ContentFile(b'first'))
+        first = recipe.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.image.save('second.jpg', ContentFile(b'second'))
+        self.assertTrue(self.storage.exists(first))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.image.save('second.jpg', ContentFile(b'second'))
+        self.assertFalse(self.storage.exists(first))
+
+    # Test that the image of a deleted recipe is deleted
+    def test_deleted_recipe_image_released(self):
+        recipe = sample_recipe(self.user)
+        recipe.image.save('photo.jpg', ContentFile(b'photo'))
+        name = recipe.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+
+        self.assertFalse(self.storage.exists(name))
+
+
+@override_settings(
+    RENDITION_ROOT=tempfile.mkdtemp(),
+    RENDITION_CACHE_MAX_BYTES=1000,
+)
+class RenditionCacheTests(TestCase):
+
+    # Test that the least recently used renditions are evicted first
+    def test_evict_renditions(self):
+        for i in range(5):
+            path = os.path.join(
+                settings.RENDITION_ROOT, f'0{i}', f'{i}.jpg'
+            )
+            os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as f:
+                f.write(b'x' * 300)
+            os.utime(path, (i, i))
+
+        self.assertEqual(evict_renditions(), 2)
+        remaining = [
+            name for name in sorted(os.listdir(settings.RENDITION_ROOT))
+            if name != '.lock'
+            and os.listdir(os.path.join(settings.RENDITION_ROOT, name))
+        ]
+        self.assertEqual(remaining, ['02', '03', '04'])
+
+
+def image_file(size, color, image_format='PNG', mode='RGB'):
+    f = io.BytesIO()
+    Image.new(mode, size, color).save(f, format=image_format)
+    f.seek(0)
+    return f
+
+
+class ImageMetadataTests(SimpleTestCase):
+
+    # Test that the color and placeholder come from the image
+    def test_image_metadata(self):
+        metadata = image_metadata(image_file((300, 200), (0, 128, 255)))
+
+        self.assertEqual(metadata['image_width'], 300)
+        self.assertEqual(metadata['image_height'], 200)
+        self.assertEqual(metadata['image_color'], '#0080ff')
+        # 4 by 3 components for landscape images
+        self.assertEqual(metadata['image_placeholder'][0], 'L')
+        self.assertEqual(len(metadata['image_placeholder']), 28)
+
+    # Test that transparent images are placed on a white background
+    def test_transparent_image(self):
+        metadata = image_metadata(
+            image_file((20, 30), (0, 0, 0, 0), mode='RGBA')
+        )
+
+        self.assertEqual(metadata['image_color'], '#ffffff')
+        # 3 by 4 components for portrait images
+        self.assertEqual(metadata['image_placeholder'][0], 'T')
+
+    # Test that large JPEG images are only partly decoded
+    def test_jpeg_draft(self):
+        metadata = image_metadata(
+            image_file((4000, 3000), (10, 200, 30), 'JPEG')
+        )
+
+        self.assertEqual(metadata['image_width'], 4000)
+        self.assertEqual(metadata['image_height'], 3000)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class UploadImageMetadataTests(TestCase):
+
+    # Test that images over the pixel limit of Pillow are stored without
+    # metadata rather than failing the upload
+    @patch.object(Image, 'MAX_IMAGE_PIXELS', 100)
+    def test_decompression_bomb(self):
+        user = get_user_model().objects.create_user('user@imran.ma')
+        recipe = sample_recipe(user)
+
+        recipe.image = SimpleUploadedFile(
+            'bomb.png',
+            image_file((30, 10), 'red').read()
+        )
+        recipe.save()
+
+        recipe.refresh_from_db()
+        self.assertTrue(recipe.image)
+        self.assertIsNone(recipe.image_width)
+        self.assertEqual(recipe.image_placeholder, '')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BackfillImageMetadataTests(TestCase):
+
+    # Test that images without metadata get it, once per file
+    def test_backfill(self):
+        user = get_user_model().objects.create_user('user@imran.ma')
+        recipes = [sample_recipe(user) for _ in range(3)]
+        recipes[0].image.save(
+            'a.png',
+            ContentFile(image_file((30, 10), 'red').read())
+        )
+        recipes[2].image.save(
+            'b.png',
+            ContentFile(b'not an image')
+        )
+        Recipe.objects.filter(pk__in=[recipes[0].pk, recipes[1].pk]).update(
+            image=recipes[0].image.name,
+            image_width=None,
+        )
+
+        out = StringIO()
+        call_command('backfill_image_metadata', workers=2, stdout=out)
+
+        widths = Recipe.objects.order_by('pk').values_list(
+            'image_width', flat=True
+        )
+        self.assertEqual(list(widths), [30, 30, None])
+        self.assertIn('1 images done, 1 failed', out.getvalue())
+
+        # The updated recipes are synced like any change
+        seqs = Recipe.objects.order_by('pk').values_list(
+            'change_seq', flat=True
+        )
+        self.assertGreater(seqs[0], recipes[2].change_seq)
+        self.assertGreater(seqs[1], seqs[0])
+        self.assertEqual(seqs[2], recipes[2].change_seq)
+
+    # Test that images over the pixel limit of Pillow count as failed
+    # without stopping the backfill
+    def test_backfill_decompression_bomb(self):
+        user = get_user_model().objects.create_user('user@imran.ma')
+        recipes = [sample_recipe(user) for _ in range(2)]
+        recipes[0].image.save(
+            'small.png',
+            ContentFile(image_file((5, 5), 'red').read())
+        )
+        recipes[1].image.save(
+            'large.png',
+            ContentFile(image_file((30, 10), 'red').read())
+        )
+        Recipe.objects.update(image_width=None)
+
+        out = StringIO()
+        with patch.object(Image, 'MAX_IMAGE_PIXELS', 100):
+            call_command('backfill_image_metadata', workers=2, stdout=out)
+
+        widths = Recipe.objects.order_by('pk').values_list(
+            'image_width', flat=True
+        )
+        self.assertEqual(list(widths), [5, None])
+        self.assertIn('1 images done, 1 failed', out.getvalue())
@@ -0,0 +1,199 @@
+from importlib import import_module
+from io import StringIO
+from unittest import skipIf, skipUnless
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from core import partitioning
+from core.deletion import _delete_where_in
+from core.models import Ingredient, Recipe, RecipeBucket, RecipeSignature, \
+    Tag
+
+
+class PartitioningTests(SimpleTestCase):
+
+    # Test the statements converting a table to a partitioned one
+    def test_partition_statements(self):
+        statements = partitioning.partition_statements(
+            'core_recipe',
+            'user_id',
+            4,
+            indexes=['CREATE INDEX idx ON public.core_recipe (user_id)'],
+            foreign_keys=[('fk_user', 'FOREIGN KEY (user_id) '
+                                      'REFERENCES core_user(id)')],
+            sequence='public.core_recipe_id_seq',
+        )
+
+        self.assertIn('PARTITION BY HASH (user_id)', statements[1])
+        partitions = [s for s in statements if 'PARTITION OF' in s]
+        self.assertEqual(len(partitions), 4)
+        self.assertIn('MODULUS 4, REMAINDER 3', partitions[-1])
+        self.assertIn(
+            'ALTER SEQUENCE public.core_recipe_id_seq OWNED BY '
+            'core_recipe.id',
+            statements
+        )
+        self.assertLess(
+            statements.index('DROP TABLE core_recipe_unpartitioned CASCADE'),
+            statements.index('ALTER TABLE core_recipe ADD PRIMARY KEY '
+                             '(id, user_id)')
+        )
+        self.assertEqual(
+            statements[-1],
+            'ALTER TABLE core_recipe ADD CONSTRAINT fk_user '
+            'FOREIGN KEY (user_id) REFERENCES core_user(id)'
+        )
+
+    # Test that through tables follow the partitioning of their recipe
+    def test_through_tables_partitioned_by_recipe(self):
+        keys = dict(partitioning.partitioned_tables())
+
+        self.assertEqual(keys['core_recipe'], 'user_id')
+        self.assertEqual(keys['core_recipe_tags'], 'recipe_id')
+
+    # Test collecting the partitions scanned by a plan
+    def test_scanned_relations(self):
+        plan = [{'Plan': {
+            'Node Type': 'Append',
+            'Plans': [{'Relation Name': 'core_recipe_p1'}],
+        }}]
+
+        self.assertEqual(
+            partitioning.scanned_relations(plan),
+            ['core_recipe_p1']
+        )
+
+    # Test that partitioning is refused outside of PostgreSQL
+    @skipIf(connection.vendor == 'postgresql', 'Running on PostgreSQL')
+    def test_partition_tables_requires_postgresql(self):
+        with self.assertRaises(CommandError):
+            call_command('partition_tables', stdout=StringIO())
+
+
+# Test deleting the rows left behind by deletes bypassing Django, which no
+# foreign key catches on partitioned tables
+class SweepOrphansTests(TestCase):
+
+    # Test that only the rows referencing deleted rows are swept
+    def test_sweep_orphans(self):
+        user = get_user_model().objects.create_user('user@imran.ma')
+        tag = Tag.objects.create(user=user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=user, name='Salt')
+        recipes = [
+            Recipe.objects.create(
+                user=user,
+                title=f'Soup {i}',
+                time_minutes=5,
+                price=10.00
+            )
+            for i in range(2)
+        ]
+        for recipe in recipes:
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        _delete_where_in(Recipe, 'id', [recipes[0].id])
+        _delete_where_in(Tag, 'id', [tag.id])
+        deleted = partitioning.sweep_orphans()
+
+        self.assertEqual(deleted['core_recipe_tags'], 2)
+        self.assertEqual(deleted['core_recipe_ingredients'], 1)
+        self.assertEqual(deleted['core_recipesignature'], 1)
+        self.assertEqual(
+            list(Recipe.ingredients.through.objects.values_list(
+                'recipe_id', flat=True
+            )),
+            [recipes[1].id]
+        )
+        self.assertEqual(
+            set(RecipeBucket.objects.values_list('recipe_id', flat=True)),
+            {recipes[1].id}
+        )
+
+
+# Test the ORM on the converted tables. They are converted back to plain
+# tables afterwards, so that the other tests do not depend on the order
+# they run in.
+@skipUnless(connection.vendor == 'postgresql', 'Not PostgreSQL')
+class PartitionedTablesTests(TransactionTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('partition_tables', '--partitions', '4',
+                     stdout=StringIO())
+
+    # Recreate the converted tables, and those whose foreign keys to them
+    # were dropped, as the migrations create them
+    @classmethod
+    def tearDownClass(cls):
+        models = (Tag, Ingredient, Recipe, RecipeSignature, RecipeBucket)
+        search_indexes = import_module('core.migrations.0010_search_indexes')
+
+        with connection.schema_editor() as editor:
+            for model in reversed(models):
+                editor.delete_model(model)
+            for model in models:
+                editor.create_model(model)
+            search_indexes.create_indexes(apps, editor)
+
+        with connection.cursor() as cursor:
+            for table, _ in partitioning.partitioned_tables():
+                assert not partitioning.is_partitioned(cursor, table)
+        super().tearDownClass()
+
+    # Test creating, linking and deleting recipes once partitioned
+    def test_orm_on_partitioned_tables(self):
+        with connection.cursor() as cursor:
+            for table, _ in partitioning.partitioned_tables():
+                self.assertTrue(partitioning.is_partitioned(cursor, table))
+
+        user = get_user_model().objects.create_user('user@imran.ma')
+        tag = Tag.objects.create(user=user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=user, name='Salt')
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Soup',
+            time_minutes=5,
+            price=10.00
+        )
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+
+        recipe = Recipe.objects.get(id=recipe.id)
+        self.assertEqual(list(recipe.tags.all()), [tag])
+        self.assertEqual(list(recipe.ingredients.all()), [ingredient])
+        self.assertTrue(RecipeSignature.objects.filter(recipe=recipe).exists())
+
+        tag.delete()
+        self.assertFalse(recipe.tags.exists())
+
+        recipe.delete()
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(Recipe.ingredients.through.objects.exists())
+        self.assertFalse(RecipeSignature.objects.exists())
+        self.assertFalse(RecipeBucket.objects.exists())
+
+    # Test that the rows left behind by raw deletes are swept
+    def test_sweep_orphans_on_partitioned_tables(self):
+        user = get_user_model().objects.create_user('user@imran.ma')
+        ingredient = Ingredient.objects.create(user=user, name='Salt')
+        recipe = Recipe.objects.create(
+            user=user,
+            title='Soup',
+            time_minutes=5,
+            price=10.00
+        )
+        recipe.ingredients.add(ingredient)
+
+        _delete_where_in(Recipe, 'id', [recipe.id])
+        self.assertTrue(Recipe.ingredients.through.objects.exists())
+        partitioning.sweep_orphans()
+
+        self.assertFalse(Recipe.ingredients.through.objects.exists())
+        self.assertFalse(RecipeSignature.objects.exists())
+        self.assertFalse(RecipeBucket.objects.exists())
@@ -0,0 +1,111 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import profiling
+from core.models import Recipe
+
+PROFILE_URL = reverse('core:memory-profile')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+# Objects kept alive across requests, like a leak would
+leaked = []
+
+
+@override_settings(MEMORY_PROFILING_RATE=1, MEMORY_PROFILING_BUFFER=3)
+class MemoryProfilingTests(TestCase):
+
+    def setUp(self):
+        profiling.reset()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        leaked.clear()
+
+    # Test that samples are attributed to viewset actions
+    def test_samples_by_action(self):
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Soup',
+            time_minutes=5,
+            price=5
+        )
+
+        self.client.get(RECIPES_URL)
+        self.client.post(
+            reverse('recipe:recipe-upload-image', args=[recipe.id]),
+            {},
+            format='multipart'
+        )
+
+        report = profiling.report()
+        self.assertEqual(
+            [sample['action'] for sample in report['samples']],
+            ['RecipeViewSet.upload_image', 'RecipeViewSet.list']
+        )
+        self.assertEqual(report['actions']['RecipeViewSet.list']['requests'],
+                         1)
+        self.assertGreater(report['samples'][0]['peak_bytes'], 0)
+
+    # Test that memory kept after a request is traced to where it was
+    # allocated
+    def test_retained_memory(self):
+        def leak(view, serializer):
+            leaked.append(bytearray(1024 * 1024))
+
+        with patch(
+            'recipe.views.TagViewSet.perform_create',
+            side_effect=leak,
+            autospec=True
+        ):
+            self.client.post(reverse('recipe:tag-list'), {'name': 'Vegan'})
+
+        sample = profiling.report()['samples'][0]
+        self.assertEqual(sample['action'], 'TagViewSet.create')
+        self.assertGreaterEqual(sample['retained_bytes'], 1024 * 1024)
+        self.assertIn(__file__, sample['sites'][0]['traceback'][-1])
+
+    # Test that each worker keeps a bounded number of samples
+    def test_buffer_bounded(self):
+        for _ in range(5):
+            self.client.get(RECIPES_URL)
+
+        report = profiling.report()
+        self.assertEqual(len(report['samples']), 3)
+        self.assertEqual(report['actions']['RecipeViewSet.list']['requests'],
+                         5)
+
+    # Test that requests are not profiled when profiling is off
+    @override_settings(MEMORY_PROFILING_RATE=0)
+    def test_profiling_off(self):
+        APIClient().get(RECIPES_URL)
+
+        self.assertEqual(profiling.report()['samples'], [])
+
+    # Test that only staff users see the memory profile
+    def test_profile_staff_only(self):
+        res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('MemoryProfileView.get', res.data['actions'])
+
+        res = self.client.delete(PROFILE_URL)
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            list(profiling.report()['actions']),
+            ['MemoryProfileView.delete']
+        )
@@ -0,0 +1,132 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase, RequestFactory, \
+    override_settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from core import routers
+from core.checks import replica_pins_shared
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Recipe
+
+
+# Return the database used to read recipes within a request
+def read_database(request):
+    response = HttpResponse()
+    response.database = routers.ReplicaRouter().db_for_read(Recipe)
+    return response
+
+
+# Return the database used to read recipes after writing within a request
+def read_after_write(request):
+    routers.ReplicaRouter().db_for_write(Recipe)
+
+    return read_database(request)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+@patch('core.routers.replica_lag', return_value=0)
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.middleware = ReplicaRoutingMiddleware(read_database)
+
+    # Test that safe requests read from a replica
+    def test_safe_request_reads_replica(self, lag):
+        request = self.factory.get('/', HTTP_AUTHORIZATION='Token abc')
+
+        self.assertEqual(self.middleware(request).database, 'replica_0')
+
+    # Test that writes and reads outside requests use the primary
+    def test_unsafe_request_reads_primary(self, lag):
+        request = self.factory.post('/', HTTP_AUTHORIZATION='Token abc')
+
+        self.assertEqual(self.middleware(request).database, 'default')
+        self.assertEqual(
+            routers.ReplicaRouter().db_for_read(Recipe),
+            'default'
+        )
+
+    # Test that a client is pinned to the primary after a write
+    def test_client_pinned_after_write(self, lag):
+        self.middleware(
+            self.factory.post('/', HTTP_AUTHORIZATION='Token abc')
+        )
+
+        pinned = self.factory.get('/', HTTP_AUTHORIZATION='Token abc')
+        other = self.factory.get('/', HTTP_AUTHORIZATION='Token xyz')
+        self.assertEqual(self.middleware(pinned).database, 'default')
+        self.assertEqual(self.middleware(other).database, 'replica_0')
+
+    # Test that reads after a write of the request use the primary
+    def test_reads_after_write_use_primary(self, lag):
+        middleware = ReplicaRoutingMiddleware(read_after_write)
+        request = self.factory.get('/', HTTP_AUTHORIZATION='Token abc')
+
+        self.assertEqual(middleware(request).database, 'default')
+        self.assertEqual(
+            self.middleware(
+                self.factory.get('/', HTTP_AUTHORIZATION='Token abc')
+            ).database,
+            'replica_0'
+        )
+
+    # Test that anonymous writes, like logging in, pin their address
+    def test_anonymous_write_pins_address(self, lag):
+        self.middleware(self.factory.post('/', REMOTE_ADDR='10.0.0.1'))
+
+        pinned = self.factory.get(
+            '/',
+            HTTP_AUTHORIZATION='Token abc',
+            REMOTE_ADDR='10.0.0.1'
+        )
+        other = self.factory.get(
+            '/',
+            HTTP_AUTHORIZATION='Token xyz',
+            REMOTE_ADDR='10.0.0.2'
+        )
+        self.assertEqual(self.middleware(pinned).database, 'default')
+        self.assertEqual(self.middleware(other).database, 'replica_0')
+
+    # Test that replicas with a cache local to each process are reported
+    def test_local_cache_warning(self, lag):
+        local = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}
+        shared = {'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': 'memcached:11211',
+        }}
+
+        with self.settings(CACHES=local):
+            self.assertEqual(
+                [warning.id for warning in replica_pins_shared(None)],
+                ['core.W001']
+            )
+        with self.settings(CACHES=shared):
+            self.assertEqual(replica_pins_shared(None), [])
+
+    # Test that lagging replicas are skipped
+    def test_lagging_replica_falls_back_to_primary(self, lag):
+        lag.return_value = 60
+        request = self.factory.get('/')
+
+        self.assertEqual(self.middleware(request).database, 'default')
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+@patch('core.routers.replica_lag', return_value=0)
+class ReplicaRouterTransactionTests(TestCase):
+
+    # Test that reads inside a transaction use the primary
+    def test_reads_in_transaction_use_primary(self, lag):
+        token = routers.allow_replica_reads()
+        try:
+            database = routers.ReplicaRouter().db_for_read(Recipe)
+        finally:
+            routers.reset_replica_reads(token)
+
+        self.assertEqual(database, 'default')
@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from core import stats
+from core.models import Recipe, UserStats
+
+
+def sample_recipe(user):
+    return Recipe.objects.create(
+        user=user,
+        title='Recipe',
+        time_minutes=5,
+        price=1,
+    )
+
+
+class UserStatsTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+
+    # Test that the recipe count follows creations and deletions
+    def test_recipe_count(self):
+        recipes = [sample_recipe(self.user) for _ in range(3)]
+        recipes[0].delete()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(stats.recipe_count(self.user.id), 2)
+
+    # Test that missing counters are created from a count
+    def test_missing_counter(self):
+        sample_recipe(self.user)
+        UserStats.objects.all().delete()
+        sample_recipe(self.user)
+
+        self.assertEqual(stats.recipe_count(self.user.id), 2)
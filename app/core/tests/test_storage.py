@@ -0,0 +1,85 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.models import Recipe
+from core.storage import is_content_name
+
+
+def sample_recipe(user, title='Recipe'):
+    return Recipe.objects.create(
+        user=user,
+        title=title,
+        time_minutes=5,
+        price=1,
+    )
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    MEDIA_RELEASE_GRACE_SECONDS=0,
+)
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+        self.field = Recipe._meta.get_field('image')
+        self.storage = self.field.storage
+
+    # Test that identical images are stored once under their hash
+    def test_identical_images_shared(self):
+        first = sample_recipe(self.user)
+        second = sample_recipe(self.user)
+
+        first.image.save('a.JPG', ContentFile(b'same bytes'))
+        second.image.save('b.jpg', ContentFile(b'same bytes'))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(is_content_name(first.image.name))
+        self.assertTrue(first.image.name.endswith('.jpg'))
+        self.assertEqual(first.image.read(), b'same bytes')
+
+    # Test that released images are deleted only once unreferenced
+    def test_release_referenced_image(self):
+        recipe = sample_recipe(self.user)
+        recipe.image.save('a.jpg', ContentFile(b'bytes'))
+        name = recipe.image.name
+
+        self.assertEqual(self.storage.release([name], self.field), [])
+        self.assertTrue(self.storage.exists(name))
+
+        Recipe.objects.filter(id=recipe.id).update(image='')
+
+        self.assertEqual(self.storage.release([name], self.field), [name])
+        self.assertFalse(self.storage.exists(name))
+
+    # Test that the command renames images to their hash and shares copies
+    def test_dedupe_media(self):
+        names = []
+        for i in range(2):
+            name = f'uploads/recipe/old-{i}.jpg'
+            path = self.storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'copied bytes')
+            Recipe.objects.filter(
+                id=sample_recipe(self.user).id
+            ).update(image=name)
+            names.append(name)
+
+        out = StringIO()
+        call_command('dedupe_media', stdout=out)
+
+        images = set(Recipe.objects.values_list('image', flat=True))
+        self.assertEqual(len(images), 1)
+        self.assertTrue(is_content_name(images.pop()))
+        self.assertFalse(any(self.storage.exists(name) for name in names))
+        self.assertIn('1 shared', out.getvalue())
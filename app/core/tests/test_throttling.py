@@ -0,0 +1,165 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TOKEN_URL = reverse('user:token')
+CREATE_USER_URL = reverse('user:create')
+
+THROTTLE_SETTINGS = {
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.AnonThrottle',
+        'core.throttling.UserThrottle',
+        'core.throttling.ScopedThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': '3/min',
+        'user': '5/min',
+        'upload_image': '2/hour',
+        'login': '2/min',
+    },
+}
+
+
+@override_settings(REST_FRAMEWORK=THROTTLE_SETTINGS)
+class ThrottlingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+
+    def get(self, client, url=RECIPES_URL, ip='10.0.0.1'):
+        return client.get(url, REMOTE_ADDR=ip)
+
+    # Send an invalid sign up, which anonymous clients are allowed to
+    def sign_up(self, ip='10.0.0.1'):
+        return self.client.post(CREATE_USER_URL, {}, REMOTE_ADDR=ip)
+
+    # Test that anonymous clients are throttled by IP address
+    def test_anon_throttled_by_ip(self):
+        for _ in range(3):
+            res = self.sign_up()
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.sign_up()
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+
+        res = self.sign_up(ip='10.0.0.2')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # Test that a forged X-Forwarded-For does not give a new budget
+    def test_forwarded_for_ignored(self):
+        for i in range(3):
+            res = self.client.post(
+                CREATE_USER_URL,
+                {},
+                REMOTE_ADDR='10.0.0.1',
+                HTTP_X_FORWARDED_FOR=f'192.168.0.{i}'
+            )
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(
+            CREATE_USER_URL,
+            {},
+            REMOTE_ADDR='10.0.0.1',
+            HTTP_X_FORWARDED_FOR='192.168.0.99'
+        )
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    # Test that a window started by another worker is counted in
+    def test_window_started_concurrently(self):
+        with patch('core.throttling.cache') as shared:
+            shared.incr.side_effect = [ValueError, 7]
+            shared.add.return_value = False
+            shared.get.return_value = 0
+
+            res = self.sign_up()
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    # Test that users are throttled by account, whatever their address
+    def test_user_throttled_by_account(self):
+        other = get_user_model().objects.create_user('other@imran.ma')
+        other_client = APIClient()
+        other_client.force_authenticate(other)
+        self.client.force_authenticate(self.user)
+
+        for i in range(5):
+            res = self.get(self.client, ip=f'10.0.0.{i}')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.get(self.client, ip='10.0.1.1')
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        res = self.get(other_client)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    # Test that image uploads have a budget of their own
+    def test_upload_image_budget(self):
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Soup',
+            time_minutes=5,
+            price=5
+        )
+        url = reverse('recipe:recipe-upload-image', args=[recipe.id])
+        self.client.force_authenticate(self.user)
+
+        for _ in range(2):
+            res = self.client.post(url, {}, format='multipart')
+            self.assertNotEqual(
+                res.status_code,
+                status.HTTP_429_TOO_MANY_REQUESTS
+            )
+
+        res = self.client.post(url, {}, format='multipart')
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(
+            self.get(self.client).status_code,
+            status.HTTP_200_OK
+        )
+
+    # Test that logins have a budget of their own
+    def test_login_budget(self):
+        payload = {'email': 'user@imran.ma', 'password': 'wrong'}
+
+        for _ in range(2):
+            res = self.client.post(TOKEN_URL, payload)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    # Test that the requests of the previous window count for the part of
+    # it the sliding window still covers
+    def test_sliding_window(self):
+        with patch('core.throttling.time.time') as now:
+            now.return_value = 59.0
+            for _ in range(3):
+                self.sign_up()
+
+            # Two thirds of the previous window are covered: 2 requests
+            now.return_value = 80.0
+            res = self.sign_up()
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            res = self.sign_up()
+            self.assertEqual(
+                res.status_code,
+                status.HTTP_429_TOO_MANY_REQUESTS
+            )
+
+            now.return_value = 121.0
+            res = self.sign_up()
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
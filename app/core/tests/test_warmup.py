@@ -0,0 +1,55 @@
+import gc
+import io
+import tempfile
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import clear_url_caches, get_resolver
+
+from core import warmup
+
+
+class WarmupTests(SimpleTestCase):
+    databases = {'default'}
+
+    def tearDown(self):
+        gc.unfreeze()
+
+    # Test that the warmup primes the resolver and freezes what it loaded
+    def test_warm_up(self):
+        clear_url_caches()
+
+        warmup.warm_up()
+
+        self.assertTrue(get_resolver()._populated)
+        self.assertGreater(gc.get_freeze_count(), 0)
+
+    # Test that a serializer failing to build does not stop the warmup
+    def test_broken_serializer(self):
+        with patch(
+            'user.serializers.UserSerializer.get_fields',
+            side_effect=RuntimeError
+        ), self.assertLogs('core.warmup', 'WARNING'):
+            warmup.warm_up()
+
+
+class CollectStaticIfChangedTests(SimpleTestCase):
+
+    # Test that the static files are only collected when they changed
+    def test_collect_when_changed(self):
+        with tempfile.TemporaryDirectory() as root, \
+                override_settings(STATIC_ROOT=root), \
+                patch('core.management.commands.collectstatic_if_changed'
+                      '.call_command') as collect:
+            call_command('collectstatic_if_changed', stdout=io.StringIO())
+            call_command('collectstatic_if_changed', stdout=io.StringIO())
+            self.assertEqual(collect.call_count, 1)
+
+            with patch(
+                'core.management.commands.collectstatic_if_changed'
+                '.static_fingerprint',
+                return_value='changed'
+            ):
+                call_command('collectstatic_if_changed', stdout=io.StringIO())
+            self.assertEqual(collect.call_count, 2)
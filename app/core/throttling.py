@@ -0,0 +1,119 @@
+import time
+
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Seconds in each unit of the rates, like '60/min'
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+# Throttle allowing a number of requests per duration to each client, with
+# a sliding window counter: requests are counted in fixed windows and the
+# count of the previous window is weighted by how much of it the sliding
+# window still covers. A request costs one atomic increment and one read of
+# the cache, shared by every worker when it is a cache server.
+class SlidingWindowThrottle(BaseThrottle):
+    scope = None
+
+    # Return the key of the client of the request, or None not to throttle
+    def get_cache_key(self, request, view):
+        raise NotImplementedError
+
+    # Identify clients by the address of their connection to nginx. The
+    # X-Forwarded-For header DRF would read is set by the client.
+    def get_ident(self, request):
+        return request.META.get('REMOTE_ADDR')
+
+    def get_scope(self, view):
+        return self.scope
+
+    # Return the number of requests and the duration of the rate of the
+    # scope, or None when the scope has no rate
+    def get_rate(self, view):
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.get_scope(view))
+        if rate is None:
+            return None
+
+        num, period = rate.split('/')
+        return int(num), DURATIONS[period[0]]
+
+    def allow_request(self, request, view):
+        rate = self.get_rate(view)
+        key = self.get_cache_key(request, view)
+        if rate is None or key is None:
+            return True
+
+        self.num_requests, self.duration = rate
+        now = time.time()
+        window, offset = divmod(now, self.duration)
+        self.elapsed = offset / self.duration
+        prefix = f'throttle:{self.get_scope(view)}:{key}'
+
+        # Denied requests count too, so that a client must slow down
+        # rather than retry at once
+        current = f'{prefix}:{int(window)}'
+        try:
+            self.count = cache.incr(current)
+        except ValueError:
+            if cache.add(current, 1, self.duration * 2):
+                self.count = 1
+            else:
+                # Another worker started the window first, or the cache
+                # is unavailable and the request is let through
+                try:
+                    self.count = cache.incr(current)
+                except ValueError:
+                    self.count = 1
+        self.previous = cache.get(f'{prefix}:{int(window) - 1}', 0)
+
+        self.estimate = self.previous * (1 - self.elapsed) + self.count
+
+        return self.estimate <= self.num_requests
+
+    # Seconds until the estimate is back under the rate, without requests
+    def wait(self):
+        excess = self.estimate - self.num_requests
+        if self.previous and excess <= self.previous * (1 - self.elapsed):
+            return self.duration * excess / self.previous
+
+        return self.duration * (1 - self.elapsed)
+
+
+# Throttle anonymous requests by IP address
+class AnonThrottle(SlidingWindowThrottle):
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+
+        return self.get_ident(request)
+
+
+# Throttle authenticated requests by user
+class UserThrottle(SlidingWindowThrottle):
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return None
+
+        return request.user.pk
+
+
+# Throttle the views or viewset actions that have a budget of their own, by
+# user or by IP address for anonymous requests. The scope is the
+# `throttle_scope` of the view, else the name of the viewset action, and
+# only scopes with a rate are throttled.
+class ScopedThrottle(SlidingWindowThrottle):
+
+    def get_scope(self, view):
+        return getattr(view, 'throttle_scope', None) \
+            or getattr(view, 'action', None)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+
+        return f'ip:{self.get_ident(request)}'
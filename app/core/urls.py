@@ -0,0 +1,15 @@
+from django.urls import path
+
+from core import views
+
+
+app_name = 'core'
+
+urlpatterns = [
+    path('batch/', views.batch_view, name='batch'),
+    path(
+        'profiling/memory/',
+        views.MemoryProfileView.as_view(),
+        name='memory-profile'
+    ),
+]
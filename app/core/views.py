@@ -0,0 +1,58 @@
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import batch, profiling, routers
+from core.serializers import BatchSerializer
+
+
+# Run several API requests in one round trip. The batch is authenticated
+# once and each request is dispatched to its view with its own status in
+# the response; each write runs in its own transaction, rolled back when
+# it fails.
+class BatchView(APIView):
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['requests']
+
+        # Batches of reads are routed like a read
+        read_only = all(
+            item['method'] in batch.SAFE_METHODS for item in items
+        )
+        request._request.read_only = read_only
+        token = routers.allow_replica_reads(
+            read_only
+            and not getattr(request._request, 'replica_pinned', True)
+        )
+        try:
+            responses = batch.run(request, items)
+        finally:
+            routers.reset_replica_reads(token)
+
+        return Response({'responses': responses})
+
+
+batch_view = BatchView.as_view()
+# Batches cannot contain batches
+batch_view.batchable = False
+
+
+# Show the memory profile of the worker answering, for staff users only.
+# Each worker keeps its own samples, tagged with its pid.
+class MemoryProfileView(APIView):
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(profiling.report())
+
+    # Clear the samples of the worker
+    def delete(self, request):
+        profiling.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,96 @@
+import gc
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import translation
+
+logger = logging.getLogger(__name__)
+
+
+# Compile the regular expressions of every URL pattern, which Django
+# otherwise does on the first request resolving them
+def _prime_resolver(resolver):
+    resolver.pattern.regex
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            _prime_resolver(pattern)
+        elif isinstance(pattern, URLPattern):
+            pattern.pattern.regex
+
+    # Build the reverse lookups of the resolver and its namespaces
+    resolver.reverse_dict
+    for _, namespace in resolver.namespace_dict.values():
+        _prime_resolver(namespace)
+
+
+# Build the fields of the serializers of every API view, filling the model
+# metadata caches DRF reads them from
+def _prime_serializers(resolver):
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            _prime_serializers(pattern)
+            continue
+
+        view = getattr(pattern.callback, 'cls', None)
+        serializer_class = getattr(view, 'serializer_class', None)
+        if serializer_class is None:
+            continue
+        try:
+            serializer_class().fields
+        except Exception:
+            logger.warning('Could not build %s', serializer_class.__name__)
+
+
+# Open and close a connection to each database, loading the driver and
+# checking the databases are reachable. The connections are closed so that
+# no socket is shared by the processes forked afterwards.
+def _prime_databases():
+    for connection in connections.all():
+        try:
+            connection.ensure_connection()
+        except DatabaseError:
+            logger.warning('Could not connect to %s', connection.alias)
+        finally:
+            connection.close()
+
+
+# Load and initialize everything workers would load on their first request:
+# run in the uWSGI master before the workers are forked, the memory is then
+# shared copy-on-write. Objects alive at the end are moved out of the reach
+# of the garbage collector, whose passes would otherwise write to the shared
+# pages of every worker.
+def warm_up():
+    start = time.perf_counter()
+
+    # Image format plugins, loaded on the first image opened
+    from PIL import Image
+    Image.init()
+
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.deactivate()
+
+    for model in apps.get_models():
+        model._meta.get_fields()
+
+    resolver = get_resolver()
+    _prime_resolver(resolver)
+    _prime_serializers(resolver)
+    _prime_databases()
+
+    gc.collect()
+    gc.freeze()
+
+    logger.info('Warmed up in %.0f ms', (time.perf_counter() - start) * 1000)
+
+
+# Connect each worker to the default database as soon as it is forked,
+# rather than on its first request
+def connect():
+    try:
+        connections['default'].ensure_connection()
+    except DatabaseError:
+        logger.warning('Could not connect to default')
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RecipeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipe'
+
+    # Register the signal handlers keeping recipe indexes up to date
+    def ready(self):
+        from recipe import pantry, similarity  # noqa: F401
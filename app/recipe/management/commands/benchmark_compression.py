@@ -0,0 +1,65 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core import compression
+from recipe.views import RecipeViewSet
+
+# Levels compared for each encoding, the default one included
+LEVELS = {
+    'gzip': (1, 6, 9),
+    'br': (1, 5, 11),
+    'zstd': (1, 3, 10),
+}
+
+
+# Django command to compare the size and compression time of the recipe
+# list of a user for each available encoding and level
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--query',
+            default='expand=tags,ingredients',
+            help='Query string of the recipe list',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError('User does not exist')
+
+        request = APIRequestFactory().get(
+            f'/api/recipe/recipes/?{options["query"]}'
+        )
+        force_authenticate(request, user=user)
+        view = RecipeViewSet.as_view({'get': 'list'})
+        content = view(request).render().content
+
+        self.stdout.write(f'Payload: {len(content)} bytes')
+        self.stdout.write(
+            f'{"encoding":<10}{"level":>6}{"bytes":>12}{"ratio":>8}'
+            f'{"ms":>10}{"MB/s":>10}'
+        )
+        for encoding in compression.COMPRESSORS:
+            for level in LEVELS[encoding]:
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    compressed = compression.compress(
+                        content, encoding, level
+                    )
+                    timings.append(time.perf_counter() - start)
+
+                best = min(timings)
+                self.stdout.write(
+                    f'{encoding:<10}{level:>6}{len(compressed):>12}'
+                    f'{len(content) / len(compressed):>8.1f}'
+                    f'{best * 1000:>10.2f}'
+                    f'{len(content) / best / 1e6:>10.1f}'
+                )
@@ -0,0 +1,63 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from recipe.views import RecipeViewSet
+
+
+# Query strings compared by default
+DEFAULT_VARIANTS = (
+    '',
+    'fields=id,title,image',
+    'fields=id,title,tags',
+    'expand=tags,ingredients',
+)
+
+
+# Django command to compare query count, payload size and time of the
+# recipe list of a user for several query strings
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--variant',
+            action='append',
+            dest='variants',
+            help='Query string to benchmark, can be repeated',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError('User does not exist')
+
+        factory = APIRequestFactory()
+        view = RecipeViewSet.as_view({'get': 'list'})
+
+        self.stdout.write(
+            f'{"query":<32}{"queries":>8}{"bytes":>12}{"ms":>10}'
+        )
+        for variant in options['variants'] or DEFAULT_VARIANTS:
+            timings = []
+            for _ in range(options['repeat']):
+                request = factory.get(f'/api/recipe/recipes/?{variant}')
+                force_authenticate(request, user=user)
+
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = view(request).render()
+                    timings.append(time.perf_counter() - start)
+
+            self.stdout.write(
+                f'{variant or "(all fields)":<32}'
+                f'{len(queries):>8}'
+                f'{len(response.content):>12}'
+                f'{min(timings) * 1000:>10.1f}'
+            )
@@ -0,0 +1,33 @@
+from django.core.management import BaseCommand
+
+from core.models import Recipe
+from recipe.similarity import update_signatures
+
+
+# Django command to (re)build the MinHash signatures of existing recipes
+class Command(BaseCommand):
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipe_ids = Recipe.objects.order_by('id') \
+            .values_list('id', flat=True) \
+            .iterator(chunk_size=batch_size)
+
+        done = 0
+        batch = []
+        for recipe_id in recipe_ids:
+            batch.append(recipe_id)
+            if len(batch) == batch_size:
+                update_signatures(batch)
+                done += len(batch)
+                batch = []
+                self.stdout.write(f'{done} recipes indexed...')
+
+        if batch:
+            update_signatures(batch)
+            done += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'{done} recipes indexed!'))
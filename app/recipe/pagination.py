@@ -0,0 +1,68 @@
+from collections import OrderedDict
+
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from core.counting import estimated_count
+
+
+# Limit/offset pagination, used only when `?limit=` is given, whose totals
+# are exact up to ESTIMATED_COUNT_THRESHOLD rows and estimated past it, as
+# flagged by `count_is_estimate`. Views can count their querysets more
+# cheaply with a `get_list_count(queryset)` method returning the same
+# (count, is_estimate) pair as `estimated_count()`.
+class EstimatedCountPagination(LimitOffsetPagination):
+    default_limit = None
+    max_limit = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        get_count = getattr(view, 'get_list_count', estimated_count)
+        self.count, self.count_is_estimate = get_count(queryset)
+        self.offset = self.get_offset(request)
+        self.request = request
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+
+        if not queryset.ordered:
+            queryset = queryset.order_by('-pk')
+        # One more row tells whether there is a next page, which estimated
+        # counts cannot
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(rows) > self.limit
+
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+
+        return replace_query_param(
+            url,
+            self.offset_query_param,
+            self.offset + self.limit
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('count_is_estimate', self.count_is_estimate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_estimate'] = {
+            'type': 'boolean',
+        }
+
+        return response_schema
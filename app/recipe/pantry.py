@@ -0,0 +1,304 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core import stats
+from core.models import Ingredient, Recipe, UserStats
+
+
+# Number of per-user indexes kept in memory by each worker
+MAX_INDEXES = getattr(settings, 'PANTRY_INDEX_MAX_USERS', 128)
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+# Return the generation of the ingredient index of a user, read from the
+# database so that every worker sees the changes made by the others
+def _current_generation(user_id):
+    generation = UserStats.objects.filter(user_id=user_id).values_list(
+        'pantry_generation',
+        flat=True
+    ).first()
+
+    return generation or 0
+
+
+# Move the generation of the index of a user forward, in the transaction
+# making the change, and return it. The row stays locked until the
+# transaction commits, so generations are numbered in commit order.
+def _next_generation(user_id):
+    connection = connections[router.db_for_write(UserStats)]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {UserStats._meta.db_table} '
+            f'SET pantry_generation = pantry_generation + 1 '
+            f'WHERE user_id = %s RETURNING pantry_generation',
+            [user_id]
+        )
+        row = cursor.fetchone()
+
+    if row is None:
+        stats.recipe_count(user_id)
+        return _next_generation(user_id)
+
+    return row[0]
+
+
+# Yield the positions of the bits set in an integer
+def _iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# In-memory recipe -> ingredient bitset index for the recipes of one user.
+#
+# Recipes are given a slot (bit position) and each ingredient keeps one big
+# integer with the bit of every recipe using it set, so a pantry query is a
+# handful of bitwise operations over whole columns instead of a loop over
+# recipes.
+class IngredientBitsetIndex:
+
+    def __init__(self, user_id, generation=0):
+        self.user_id = user_id
+        self.generation = generation
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.recipe_ids = []
+        self.free_slots = []
+        self.live = 0
+        self.columns = {}
+        self.ingredients = {}
+
+    # Build the index with a single query over the recipes of the user
+    @classmethod
+    def build(cls, user_id, generation=0):
+        index = cls(user_id, generation)
+        rows = Recipe.objects.filter(user_id=user_id) \
+            .values_list('id', 'ingredients') \
+            .order_by('id')
+
+        for recipe_id, ingredient_id in rows:
+            index._add_recipe(recipe_id)
+            if ingredient_id is not None:
+                index._link(recipe_id, ingredient_id)
+
+        return index
+
+    def _add_recipe(self, recipe_id):
+        if recipe_id in self.slots:
+            return self.slots[recipe_id]
+
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.recipe_ids[slot] = recipe_id
+        else:
+            slot = len(self.recipe_ids)
+            self.recipe_ids.append(recipe_id)
+
+        self.slots[recipe_id] = slot
+        self.ingredients[recipe_id] = set()
+        self.live |= 1 << slot
+
+        return slot
+
+    def _link(self, recipe_id, ingredient_id):
+        slot = self._add_recipe(recipe_id)
+        self.ingredients[recipe_id].add(ingredient_id)
+        self.columns[ingredient_id] = \
+            self.columns.get(ingredient_id, 0) | (1 << slot)
+
+    def _unlink(self, recipe_id, ingredient_id):
+        slot = self.slots.get(recipe_id)
+        if slot is None:
+            return
+
+        self.ingredients[recipe_id].discard(ingredient_id)
+        column = self.columns.get(ingredient_id, 0) & ~(1 << slot)
+        if column:
+            self.columns[ingredient_id] = column
+        else:
+            self.columns.pop(ingredient_id, None)
+
+    def add_recipe(self, recipe_id):
+        with self.lock:
+            self._add_recipe(recipe_id)
+
+    def remove_recipe(self, recipe_id):
+        with self.lock:
+            slot = self.slots.get(recipe_id)
+            if slot is None:
+                return
+
+            for ingredient_id in list(self.ingredients[recipe_id]):
+                self._unlink(recipe_id, ingredient_id)
+
+            del self.slots[recipe_id]
+            del self.ingredients[recipe_id]
+            self.recipe_ids[slot] = None
+            self.free_slots.append(slot)
+            self.live &= ~(1 << slot)
+
+    def add_ingredients(self, recipe_id, ingredient_ids):
+        with self.lock:
+            for ingredient_id in ingredient_ids:
+                self._link(recipe_id, ingredient_id)
+
+    def remove_ingredients(self, recipe_id, ingredient_ids):
+        with self.lock:
+            for ingredient_id in ingredient_ids:
+                self._unlink(recipe_id, ingredient_id)
+
+    def clear_ingredients(self, recipe_id):
+        with self.lock:
+            for ingredient_id in list(self.ingredients.get(recipe_id, ())):
+                self._unlink(recipe_id, ingredient_id)
+
+    def remove_ingredient(self, ingredient_id):
+        with self.lock:
+            column = self.columns.pop(ingredient_id, 0)
+            for slot in _iter_bits(column):
+                self.ingredients[self.recipe_ids[slot]].discard(ingredient_id)
+
+    # Return (recipe id, missing ingredient ids) for the recipes that miss
+    # at most `max_missing` ingredients from the pantry, fewest missing first
+    def match(self, pantry_ids, max_missing=0, limit=None):
+        pantry_ids = set(pantry_ids)
+
+        with self.lock:
+            # No recipe misses more ingredients than the index has
+            max_missing = min(max_missing, len(self.columns))
+
+            # at_least[k] has the bit of every recipe missing more than k
+            # ingredients, as saturating bit-sliced counters
+            at_least = [0] * (max_missing + 1)
+            for ingredient_id, column in self.columns.items():
+                if ingredient_id in pantry_ids:
+                    continue
+                for k in range(max_missing, 0, -1):
+                    at_least[k] |= at_least[k - 1] & column
+                at_least[0] |= column
+
+            matches = []
+            previous = self.live
+            for missing_count in range(max_missing + 1):
+                exact = previous & ~at_least[missing_count]
+                previous &= at_least[missing_count]
+                recipe_ids = sorted(
+                    self.recipe_ids[slot] for slot in _iter_bits(exact)
+                )
+                for recipe_id in recipe_ids:
+                    missing = sorted(self.ingredients[recipe_id] - pantry_ids)
+                    matches.append((recipe_id, missing))
+                    if limit is not None and len(matches) >= limit:
+                        return matches
+
+        return matches
+
+
+# Return the up to date index of a user, building it when needed
+def get_index(user_id):
+    generation = _current_generation(user_id)
+
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is not None and index.generation == generation:
+            _indexes.move_to_end(user_id)
+            return index
+
+    index = IngredientBitsetIndex.build(user_id, generation)
+
+    with _indexes_lock:
+        _indexes[user_id] = index
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+
+    return index
+
+
+# Apply a change to the index of a user once the transaction is committed.
+#
+# Every change moves the generation of the user forward so other workers
+# rebuild their copy; the local copy is only patched in place when no other
+# change was committed in between, otherwise it is dropped.
+def _on_commit(user_id, change):
+    generation = _next_generation(user_id)
+
+    def apply():
+        with _indexes_lock:
+            index = _indexes.get(user_id)
+        if index is None:
+            return
+
+        if generation == index.generation + 1:
+            change(index)
+            index.generation = generation
+        else:
+            with _indexes_lock:
+                if _indexes.get(user_id) is index:
+                    del _indexes[user_id]
+
+    transaction.on_commit(apply)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        recipe_id = instance.id
+        _on_commit(instance.user_id,
+                   lambda index: index.add_recipe(recipe_id))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    recipe_id = instance.id
+    _on_commit(instance.user_id,
+               lambda index: index.remove_recipe(recipe_id))
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    ingredient_id = instance.id
+    _on_commit(instance.user_id,
+               lambda index: index.remove_ingredient(ingredient_id))
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_ingredients_changed(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    user_id = instance.user_id
+
+    if action == 'post_clear':
+        if reverse:
+            ingredient_id = instance.id
+            _on_commit(user_id,
+                       lambda index: index.remove_ingredient(ingredient_id))
+        else:
+            recipe_id = instance.id
+            _on_commit(user_id,
+                       lambda index: index.clear_ingredients(recipe_id))
+        return
+
+    pairs = [(instance.id, pk) for pk in pk_set]
+    if reverse:
+        pairs = [(pk, instance.id) for pk in pk_set]
+
+    def change(index):
+        for recipe_id, ingredient_id in pairs:
+            if action == 'post_add':
+                index.add_ingredients(recipe_id, [ingredient_id])
+            else:
+                index.remove_ingredients(recipe_id, [ingredient_id])
+
+    _on_commit(user_id, change)
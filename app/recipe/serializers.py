@@ -1,10 +1,140 @@
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+from core import changes, media
 from core.models import Tag
 from core.models import Ingredient, Recipe
 
 
+# Recipe image represented by the URL of the endpoint sending it, rather
+# than its media URL, versioned so that clients can cache it for good
+class RecipeImageField(serializers.ImageField):
+
+    def to_representation(self, value):
+        if not value:
+            return None
+
+        url = reverse('recipe:recipe-image', args=[value.instance.pk])
+        url = f'{url}?v={media.image_version(value.name)}'
+        request = self.context.get('request')
+
+        return request.build_absolute_uri(url) if request else url
+
+
+# Model serializer field mapping representing images with RecipeImageField
+RECIPE_FIELD_MAPPING = {
+    **serializers.ModelSerializer.serializer_field_mapping,
+    models.ImageField: RecipeImageField,
+}
+
+
+# Drop the fields not listed in the `fields` context of the serializer
+class SparseFieldsMixin:
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        fields = self.context.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+# Many related field validating the whole list of values at once
+class BulkManyRelatedField(serializers.ManyRelatedField):
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        return self.child_relation.to_internal_value_bulk(data)
+
+
+# Primary key related field limited to the objects of the request user.
+# With many=True the ids are checked with a single `IN` query, and with
+# `allow_new` items given as {"name": ...} are matched by name, unknown
+# names becoming unsaved objects for the serializer to create.
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    default_error_messages = {
+        'invalid_name': _('Invalid name "{name}" - expected a non-empty '
+                          'string of at most {max_length} characters.'),
+    }
+
+    def __init__(self, **kwargs):
+        self.allow_new = kwargs.pop('allow_new', False)
+        super().__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+
+        return BulkManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+
+        if request is None or not request.user.is_authenticated:
+            return queryset.none()
+
+        return queryset.filter(user=request.user)
+
+    def to_internal_value_bulk(self, data):
+        queryset = self.get_queryset()
+        pk_field = queryset.model._meta.pk
+        max_length = queryset.model._meta.get_field('name').max_length
+
+        items = []
+        for item in data:
+            if self.allow_new and isinstance(item, dict):
+                name = item.get('name')
+                if not isinstance(name, str) or not name.strip() \
+                        or len(name.strip()) > max_length:
+                    self.fail('invalid_name', name=name,
+                              max_length=max_length)
+                items.append(('name', name.strip()))
+                continue
+
+            try:
+                items.append(('pk', pk_field.to_python(item)))
+            except (TypeError, ValidationError):
+                self.fail('incorrect_type', data_type=type(item).__name__)
+
+        pks = {value for kind, value in items if kind == 'pk'}
+        names = {value for kind, value in items if kind == 'name'}
+        found = queryset.filter(Q(pk__in=pks) | Q(name__in=names)) \
+            .order_by('pk') if items else []
+
+        by_key = {}
+        for obj in found:
+            by_key.setdefault(('pk', obj.pk), obj)
+            if obj.name in names:
+                by_key.setdefault(('name', obj.name), obj)
+
+        objects = {}
+        for kind, value in items:
+            if kind == 'pk' and (kind, value) not in by_key:
+                self.fail('does_not_exist', pk_value=value)
+            if (kind, value) not in by_key:
+                by_key[(kind, value)] = queryset.model(name=value)
+
+            obj = by_key[(kind, value)]
+            objects.setdefault(id(obj), obj)
+
+        return list(objects.values())
+
+
 # Serializer for tag objects
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ("id", "name")
@@ -12,7 +142,7 @@ class TagSerializer(serializers.ModelSerializer):
 
 
 # Serializer for ingredient objects
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name')
@@ -20,23 +150,95 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 # Serializer a recipe
-class RecipeSerializer(serializers.ModelSerializer):
-    ingredients = serializers.PrimaryKeyRelatedField(
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    serializer_field_mapping = RECIPE_FIELD_MAPPING
+
+    ingredients = UserPrimaryKeyRelatedField(
         many=True,
+        allow_new=True,
         queryset=Ingredient.objects.all()
     )
 
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserPrimaryKeyRelatedField(
         many=True,
+        allow_new=True,
         queryset=Tag.objects.all()
     )
 
+    # Related fields that `expand` inlines as objects instead of ids
+    expandable_fields = {
+        'tags': TagSerializer,
+        'ingredients': IngredientSerializer,
+    }
+
     class Meta:
         model = Recipe
         fields = ('id', 'title', 'time_minutes', 'price',
-                  'link', 'ingredients', 'tags', 'image'
+                  'link', 'ingredients', 'tags', 'image', 'image_width',
+                  'image_height', 'image_color', 'image_placeholder'
                   )
-        read_only_fields = ('id',)
+        read_only_fields = ('id', 'image_width', 'image_height',
+                            'image_color', 'image_placeholder')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        for name in self.context.get('expand', ()):
+            if name in self.expandable_fields and name in self.fields:
+                self.fields[name] = self.expandable_fields[name](
+                    many=True,
+                    read_only=True
+                )
+
+    # Create a recipe, its new tags and ingredients and link them all
+    # in a single transaction
+    def create(self, validated_data):
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+
+        with transaction.atomic():
+            recipe = super().create(validated_data)
+
+            if tags:
+                recipe.tags.add(*self._save_new(tags, recipe.user))
+            if ingredients:
+                recipe.ingredients.add(
+                    *self._save_new(ingredients, recipe.user)
+                )
+
+        return recipe
+
+    # Update a recipe, only writing the tag and ingredient links that changed
+    def update(self, instance, validated_data):
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+
+        with transaction.atomic():
+            recipe = super().update(instance, validated_data)
+
+            if tags is not None:
+                recipe.tags.set(self._save_new(tags, recipe.user))
+            if ingredients is not None:
+                recipe.ingredients.set(
+                    self._save_new(ingredients, recipe.user)
+                )
+
+        return recipe
+
+    # Insert the objects given by name that do not exist yet in one statement.
+    # bulk_create() sends no pre_save signal: their positions in the change
+    # sequence are taken here, in one block.
+    def _save_new(self, objects, user):
+        new = [obj for obj in objects if obj.pk is None]
+
+        if new:
+            last = changes.next_change_seq(user.id, len(new))
+            for seq, obj in enumerate(new, last - len(new) + 1):
+                obj.user = user
+                obj.change_seq = seq
+            type(new[0]).objects.bulk_create(new)
+
+        return objects
 
 
 # Serialize a recipe detail
@@ -45,9 +247,42 @@ class RecipeDetailSerializer(RecipeSerializer):
     ingredients = IngredientSerializer(many=True, read_only=True)
 
 
+# Serialize a recipe matched against the ingredients of a pantry
+class RecipePantrySerializer(RecipeSerializer):
+    missing_ingredients = serializers.SerializerMethodField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('missing_ingredients',)
+
+    def get_missing_ingredients(self, obj):
+        return self.context['missing'].get(obj.id, [])
+
+
+# Serialize a recipe with its similarity to a reference recipe
+class RecipeSimilarSerializer(RecipeSerializer):
+    similarity = serializers.SerializerMethodField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('similarity',)
+
+    def get_similarity(self, obj):
+        return round(self.context['similarity'].get(obj.id, 0.0), 4)
+
+
+# Serialize an ingredient of a shopping list with the recipes needing it
+class ShoppingListItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    recipes = serializers.ListField(child=serializers.IntegerField())
+
+
 # Serializer to uploading image to recipes
 class RecipeImageSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = RECIPE_FIELD_MAPPING
+
     class Meta:
         model = Recipe
-        fields = ("id", "image")
-        read_only_fields = ('id',)
+        fields = ("id", "image", 'image_width', 'image_height',
+                  'image_color', 'image_placeholder')
+        read_only_fields = ('id', 'image_width', 'image_height',
+                            'image_color', 'image_placeholder')
@@ -0,0 +1,199 @@
+import hashlib
+import random
+import struct
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, pre_delete
+from django.dispatch import receiver
+
+from core.models import Ingredient, Recipe, RecipeBucket, RecipeSignature, \
+    Tag
+
+
+# 64 hash functions split in 16 bands of 4 rows: recipes with a Jaccard
+# similarity around 0.5 and above share a bucket with high probability
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS = NUM_PERMUTATIONS // BANDS
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20220521)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+# Return the feature set of each recipe: tags and ingredients kept apart
+def recipe_features(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    features = {recipe_id: set() for recipe_id in recipe_ids}
+
+    tags = Recipe.tags.through.objects \
+        .filter(recipe_id__in=recipe_ids) \
+        .values_list('recipe_id', 'tag_id')
+    for recipe_id, tag_id in tags:
+        features[recipe_id].add(tag_id * 2)
+
+    ingredients = Recipe.ingredients.through.objects \
+        .filter(recipe_id__in=recipe_ids) \
+        .values_list('recipe_id', 'ingredient_id')
+    for recipe_id, ingredient_id in ingredients:
+        features[recipe_id].add(ingredient_id * 2 + 1)
+
+    return features
+
+
+def minhash(features):
+    if not features:
+        return []
+
+    return [
+        min((a * feature + b) % _PRIME for feature in features)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+# Hash each band of a signature to a signed 64 bits bucket id
+def band_buckets(signature):
+    buckets = []
+    for band in range(len(signature) // ROWS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(
+            struct.pack(f'>{ROWS}Q', *rows),
+            digest_size=8,
+        ).digest()
+        buckets.append((band, struct.unpack('>q', digest)[0]))
+
+    return buckets
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 0.0
+
+    return len(a & b) / len(a | b)
+
+
+# Recompute and store the signature and buckets of the given recipes and
+# return their signatures. The rows of the recipes stay locked until the
+# transaction commits, so that concurrent updates of a recipe replace each
+# other's signature rather than conflict.
+def update_signatures(recipe_ids):
+    with transaction.atomic():
+        recipes = dict(
+            Recipe.objects.select_for_update()
+            .filter(id__in=recipe_ids)
+            .order_by('id')
+            .values_list('id', 'user_id')
+        )
+        if not recipes:
+            return {}
+
+        features = recipe_features(recipes)
+        signatures = {
+            recipe_id: minhash(features[recipe_id]) for recipe_id in recipes
+        }
+
+        RecipeSignature.objects.filter(recipe_id__in=recipes).delete()
+        RecipeSignature.objects.bulk_create([
+            RecipeSignature(recipe_id=recipe_id, minhash=signature)
+            for recipe_id, signature in signatures.items()
+        ])
+
+        RecipeBucket.objects.filter(recipe_id__in=recipes).delete()
+        RecipeBucket.objects.bulk_create([
+            RecipeBucket(
+                user_id=recipes[recipe_id],
+                recipe_id=recipe_id,
+                band=band,
+                bucket=bucket,
+            )
+            for recipe_id, signature in signatures.items()
+            for band, bucket in band_buckets(signature)
+        ])
+
+    return signatures
+
+
+# Return (recipe id, similarity) of the recipes of the same user closest to
+# the given one. Candidates come from the LSH buckets shared with the recipe;
+# `brute_force` compares against every recipe of the user instead.
+def similar_recipes(recipe, limit=10, brute_force=False):
+    if brute_force:
+        candidates = set(
+            Recipe.objects.filter(user_id=recipe.user_id)
+            .exclude(id=recipe.id)
+            .values_list('id', flat=True)
+        )
+    else:
+        signature = RecipeSignature.objects \
+            .filter(recipe_id=recipe.id) \
+            .values_list('minhash', flat=True) \
+            .first()
+        if signature is None:
+            signature = update_signatures([recipe.id]).get(recipe.id, [])
+
+        buckets = band_buckets(signature)
+        if not buckets:
+            return []
+
+        match = Q()
+        for band, bucket in buckets:
+            match |= Q(band=band, bucket=bucket)
+
+        candidates = set(
+            RecipeBucket.objects
+            .filter(match, user_id=recipe.user_id)
+            .exclude(recipe_id=recipe.id)
+            .values_list('recipe_id', flat=True)
+        )
+
+    features = recipe_features(candidates | {recipe.id})
+    reference = features.pop(recipe.id)
+
+    scores = [
+        (recipe_id, jaccard(reference, candidate))
+        for recipe_id, candidate in features.items()
+    ]
+    scores = [score for score in scores if score[1] > 0]
+    scores.sort(key=lambda score: (-score[1], score[0]))
+
+    return scores[:limit]
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_features_changed(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._similarity_recipe_ids = list(
+            instance.recipe_set.values_list('id', flat=True)
+        )
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        update_signatures([instance.id])
+    elif action == 'post_clear':
+        update_signatures(instance.__dict__.pop('_similarity_recipe_ids', []))
+    else:
+        update_signatures(pk_set)
+
+
+# Deleting a tag or an ingredient removes its links without m2m signals
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def recipe_feature_deleting(sender, instance, **kwargs):
+    instance._similarity_recipe_ids = list(
+        instance.recipe_set.values_list('id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_feature_deleted(sender, instance, **kwargs):
+    recipe_ids = instance.__dict__.pop('_similarity_recipe_ids', [])
+    if recipe_ids:
+        update_signatures(recipe_ids)
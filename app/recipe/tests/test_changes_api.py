@@ -0,0 +1,248 @@
+from datetime import timedelta
+from importlib import import_module
+from unittest.mock import patch
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.db import connection
+from django.db.transaction import TransactionManagementError
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import changes
+from core.changes import next_change_seq, prune_tombstones
+from core.models import Ingredient, Recipe, Tag, Tombstone, UserStats
+
+CHANGES_URL = reverse('recipe:changes')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def sample_recipe(user, **params):
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 5,
+        'price': 10.00
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+# Test the delta sync API
+class ChangesApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user,
+            name='Salt'
+        )
+        self.recipe = sample_recipe(self.user)
+
+    def sync(self, **params):
+        res = self.client.get(CHANGES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return res.data
+
+    # Test that syncing without a token returns everything
+    def test_full_sync(self):
+        other = get_user_model().objects.create_user('other@imran.ma')
+        Tag.objects.create(user=other, name='Other')
+
+        data = self.sync()
+
+        self.assertEqual([tag['id'] for tag in data['tags']], [self.tag.id])
+        self.assertEqual(len(data['ingredients']), 1)
+        self.assertEqual(len(data['recipes']), 1)
+        self.assertFalse(data['has_more'])
+
+    # Test that syncing from a token returns the changes since only
+    def test_delta_sync(self):
+        token = self.sync()['token']
+        ingredient_id = self.ingredient.id
+        self.tag.name = 'Vegetarian'
+        self.tag.save()
+        self.ingredient.delete()
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Soup',
+            'time_minutes': 10,
+            'price': 3,
+            'tags': [{'name': 'Winter'}],
+            'ingredients': [],
+        }, format='json')
+
+        data = self.sync(since=token)
+
+        self.assertEqual(
+            sorted(tag['name'] for tag in data['tags']),
+            ['Vegetarian', 'Winter']
+        )
+        self.assertEqual(
+            [recipe['id'] for recipe in data['recipes']],
+            [res.data['id']]
+        )
+        self.assertEqual(data['ingredients'], [])
+        self.assertEqual(data['deleted']['ingredients'], [ingredient_id])
+        self.assertEqual(self.sync(since=data['token'])['tags'], [])
+
+    # Test that changing the tags of a recipe changes the recipe
+    def test_recipe_links_changed(self):
+        token = self.sync()['token']
+
+        self.recipe.tags.add(self.tag)
+
+        data = self.sync(since=token)
+        self.assertEqual(data['recipes'][0]['tags'], [self.tag.id])
+
+    # Test that changes come by pages of at most `limit`
+    def test_sync_pages(self):
+        token = self.sync()['token']
+        tags = [
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+            for i in range(5)
+        ]
+
+        names = []
+        while True:
+            data = self.sync(since=token, limit=2)
+            names += [tag['name'] for tag in data['tags']]
+            token = data['token']
+            if not data['has_more']:
+                break
+
+        self.assertEqual(names, [tag.name for tag in tags])
+
+    # Test that a full sync is paged too, and the changes made while paging
+    # are in the following pages
+    def test_full_sync_pages(self):
+        for i in range(4):
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+
+        data = self.sync(limit=2)
+        self.assertTrue(data['has_more'])
+        self.assertTrue(data['token'].startswith('full-'))
+        tags = {tag['id']: tag['name'] for tag in data['tags']}
+        self.tag.delete()
+
+        deleted = []
+        while data['has_more']:
+            data = self.sync(since=data['token'], limit=2)
+            tags.update((tag['id'], tag['name']) for tag in data['tags'])
+            deleted += data['deleted']['tags']
+        for tag_id in deleted:
+            tags.pop(tag_id, None)
+
+        self.assertEqual(
+            sorted(tags.values()),
+            ['Tag 0', 'Tag 1', 'Tag 2', 'Tag 3']
+        )
+        self.assertFalse(data['token'].startswith('full-'))
+        self.sync(since=data['token'])
+
+    # Test that a full sync resumed after the tombstones of the rows it was
+    # sent were pruned must start over
+    def test_full_sync_expired(self):
+        data = self.sync(limit=1)
+        self.assertEqual(data['tags'][0]['id'], self.tag.id)
+        self.tag.delete()
+        Tombstone.objects.update(
+            deleted_at=timezone.now() - timedelta(days=60)
+        )
+        prune_tombstones(30)
+
+        res = self.client.get(CHANGES_URL, {'since': data['token']})
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+    # Test that the rows created before change tracking are numbered by
+    # its migration and returned by full syncs
+    def test_migration_numbers_existing_rows(self):
+        migration = import_module('core.migrations.0012_change_tracking')
+        other = get_user_model().objects.create_user('other@imran.ma')
+        Tag.objects.create(user=other, name='Other')
+        for model in (Tag, Ingredient, Recipe):
+            model.objects.update(change_seq=0)
+        UserStats.objects.update(change_seq=0)
+        UserStats.objects.filter(user=other).delete()
+
+        migration.number_changes(apps, None)
+
+        self.assertEqual(
+            sorted(Tag.objects.values_list('change_seq', flat=True)),
+            [1, 1]
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).change_seq,
+            3
+        )
+        self.assertEqual(
+            UserStats.objects.filter(user=other).values_list(
+                'change_seq', 'recipe_count'
+            ).get(),
+            (1, 0)
+        )
+        data = self.sync()
+        self.assertEqual(len(data['tags']), 1)
+        self.assertEqual(len(data['ingredients']), 1)
+        self.assertEqual(len(data['recipes']), 1)
+
+    # Test that tokens older than the pruned tombstones are rejected
+    def test_expired_token(self):
+        token = self.sync()['token']
+        self.tag.delete()
+        Tombstone.objects.update(
+            deleted_at=timezone.now() - timedelta(days=60)
+        )
+
+        self.assertEqual(prune_tombstones(30), 1)
+
+        res = self.client.get(CHANGES_URL, {'since': token})
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+        self.sync(since=self.sync()['token'])
+
+
+# Test the change sequence positions are taken in the transaction writing
+# the change, outside of the transaction wrapping each TestCase test
+class ChangeSequenceTransactionTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+        self.in_transaction = []
+
+    def next_change_seq(self, user_id, count=1):
+        self.in_transaction.append(connection.in_atomic_block)
+
+        return next_change_seq(user_id, count)
+
+    # Test that tracked writes in autocommit mode are made in a transaction
+    def test_autocommit_writes(self):
+        with patch.object(changes, 'next_change_seq', self.next_change_seq):
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+            tag.name = 'Vegetarian'
+            tag.save()
+            recipe = sample_recipe(self.user)
+            recipe.tags.add(tag)
+            tag.delete()
+
+        self.assertEqual(self.in_transaction, [True] * 5)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.change_seq, 4)
+
+    # Test that positions cannot be taken in autocommit mode
+    def test_autocommit_rejected(self):
+        with self.assertRaises(TransactionManagementError):
+            next_change_seq(self.user.id)
@@ -0,0 +1,148 @@
+import tempfile
+from io import BytesIO
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.urls import reverse
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+
+# Return URL for the image of a recipe
+def image_url(recipe_id):
+    return reverse('recipe:recipe-image', args=[recipe_id])
+
+
+# Create and return a recipe with a JPEG image of the given size
+def sample_recipe(user, size=(800, 600)):
+    recipe = Recipe.objects.create(
+        user=user,
+        title='Sample recipe',
+        time_minutes=5,
+        price=10.00,
+    )
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, format='JPEG')
+    recipe.image.save('photo.jpg', ContentFile(buffer.getvalue()))
+
+    return recipe
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    RENDITION_ROOT=tempfile.mkdtemp(),
+)
+class RecipeImageApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+
+    # Test resizing an image to an allowed width and format
+    def test_rendition(self):
+        recipe = sample_recipe(self.user)
+
+        res = self.client.get(
+            image_url(recipe.id),
+            {'width': 320, 'type': 'webp'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        self.assertIn('ETag', res)
+        with Image.open(BytesIO(b''.join(res.streaming_content))) as image:
+            self.assertEqual(image.size, (320, 240))
+
+    # Test that images are never enlarged
+    def test_rendition_smaller_image(self):
+        recipe = sample_recipe(self.user, size=(100, 50))
+
+        res = self.client.get(image_url(recipe.id), {'width': 320})
+
+        with Image.open(BytesIO(b''.join(res.streaming_content))) as image:
+            self.assertEqual(image.size, (100, 50))
+
+    # Test that cached renditions are sent by nginx
+    @override_settings(MEDIA_ACCEL_REDIRECT=True)
+    def test_rendition_accel_redirect(self):
+        recipe = sample_recipe(self.user)
+
+        first = self.client.get(image_url(recipe.id), {'width': 160})
+        second = self.client.get(image_url(recipe.id), {'width': 160})
+
+        self.assertEqual(first.content, b'')
+        self.assertTrue(
+            first['X-Accel-Redirect'].startswith('/internal/renditions/')
+        )
+        self.assertEqual(first['X-Accel-Redirect'],
+                         second['X-Accel-Redirect'])
+
+    # Test sending the original image through nginx
+    @override_settings(MEDIA_ACCEL_REDIRECT=True)
+    def test_original_image(self):
+        recipe = sample_recipe(self.user)
+
+        res = self.client.get(image_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(
+            res['X-Accel-Redirect'],
+            f'/internal/media/{recipe.image.name}'
+        )
+        self.assertNotIn('immutable', res['Cache-Control'])
+
+    # Test that the image URL of a recipe is cached for good
+    def test_versioned_image_url(self):
+        recipe = sample_recipe(self.user)
+        url = self.client.get(
+            reverse('recipe:recipe-detail', args=[recipe.id])
+        ).data['image']
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('immutable', res['Cache-Control'])
+
+    # Test that clients holding the current image get a 304
+    def test_image_not_modified(self):
+        recipe = sample_recipe(self.user)
+        etag = self.client.get(image_url(recipe.id))['ETag']
+
+        res = self.client.get(
+            image_url(recipe.id),
+            HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    # Test that widths and formats outside the allowlist are rejected
+    def test_rendition_invalid_parameters(self):
+        recipe = sample_recipe(self.user)
+
+        for params in ({'width': 321}, {'width': 'big'},
+                       {'width': 320, 'type': 'gif'}):
+            res = self.client.get(image_url(recipe.id), params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # Test that the images of other users cannot be resized
+    def test_rendition_other_user(self):
+        other = get_user_model().objects.create_user(
+            'other@imran.ma',
+            'password123'
+        )
+        recipe = sample_recipe(other)
+
+        res = self.client.get(image_url(recipe.id), {'width': 320})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,146 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Ingredient, UserStats
+
+from recipe import pantry
+
+PANTRY_URL = reverse('recipe:recipe-pantry')
+
+
+# Create and return a simple recipe using the given ingredients
+def sample_recipe(user, title, ingredients=()):
+    recipe = Recipe.objects.create(
+        user=user,
+        title=title,
+        time_minutes=10,
+        price=5.00
+    )
+    recipe.ingredients.add(*ingredients)
+
+    return recipe
+
+
+# Test the "what can I cook" pantry API
+class PantryApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+
+        self.eggs = Ingredient.objects.create(user=self.user, name='Eggs')
+        self.milk = Ingredient.objects.create(user=self.user, name='Milk')
+        self.flour = Ingredient.objects.create(user=self.user, name='Flour')
+
+    # Test that only recipes fully covered by the pantry are returned
+    def test_pantry_returns_subset_recipes(self):
+        omelette = sample_recipe(self.user, 'Omelette', [self.eggs])
+        sample_recipe(self.user, 'Pancakes',
+                      [self.eggs, self.milk, self.flour])
+
+        res = self.client.get(PANTRY_URL, {
+            'ingredients': f'{self.eggs.id},{self.milk.id}'
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data], [omelette.id])
+        self.assertEqual(res.data[0]['missing_ingredients'], [])
+
+    # Test that recipes are ranked by the number of missing ingredients
+    def test_pantry_ranked_by_missing(self):
+        pancakes = sample_recipe(self.user, 'Pancakes',
+                                 [self.eggs, self.milk, self.flour])
+        omelette = sample_recipe(self.user, 'Omelette', [self.eggs])
+        bread = sample_recipe(self.user, 'Bread', [self.eggs, self.flour])
+
+        res = self.client.get(PANTRY_URL, {
+            'ingredients': f'{self.eggs.id}',
+            'max_missing': 2,
+        })
+
+        self.assertEqual(
+            [r['id'] for r in res.data],
+            [omelette.id, bread.id, pancakes.id]
+        )
+        self.assertEqual(res.data[1]['missing_ingredients'], [self.flour.id])
+        self.assertEqual(
+            res.data[2]['missing_ingredients'],
+            sorted([self.milk.id, self.flour.id])
+        )
+
+    # Test that recipes of other users are not matched
+    def test_pantry_limited_to_user(self):
+        user2 = get_user_model().objects.create_user(
+            'other@imran.ma',
+            'password123'
+        )
+        eggs = Ingredient.objects.create(user=user2, name='Eggs')
+        sample_recipe(user2, 'Omelette', [eggs])
+
+        res = self.client.get(PANTRY_URL, {'ingredients': f'{eggs.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
+
+    # Test that invalid parameters are rejected
+    def test_pantry_invalid_params(self):
+        res = self.client.get(PANTRY_URL, {'ingredients': 'eggs'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(PANTRY_URL, {'limit': 100000})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # Test that a huge number of missing ingredients is bounded by the
+    # ingredients of the user
+    def test_pantry_max_missing_bounded(self):
+        sample_recipe(self.user, 'Crepes', [self.eggs, self.milk, self.flour])
+
+        res = self.client.get(PANTRY_URL, {'max_missing': 10 ** 12})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data[0]['missing_ingredients']), 3)
+
+    # Test that the index follows changes to recipe ingredients
+    def test_index_updated_incrementally(self):
+        recipe = sample_recipe(self.user, 'Omelette', [self.eggs])
+        index = pantry.get_index(self.user.id)
+        self.assertEqual(index.match([self.eggs.id]), [(recipe.id, [])])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.ingredients.add(self.milk)
+
+        self.assertIs(pantry.get_index(self.user.id), index)
+        self.assertEqual(index.match([self.eggs.id]), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.milk.delete()
+
+        self.assertEqual(index.match([self.eggs.id]), [(recipe.id, [])])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+
+        self.assertEqual(index.match([self.eggs.id]), [])
+        self.assertIs(pantry.get_index(self.user.id), index)
+
+    # Test that an index changed by another worker is rebuilt
+    def test_index_rebuilt_when_generation_changes(self):
+        index = pantry.get_index(self.user.id)
+        UserStats.objects.filter(user=self.user).update(
+            pantry_generation=F('pantry_generation') + 1
+        )
+
+        self.assertIsNot(pantry.get_index(self.user.id), index)
@@ -1,10 +1,13 @@
 import os
 import tempfile
+from unittest.mock import Mock
 from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -245,6 +248,30 @@ class RecipeImageUploadTests(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    # Test that the size, color and placeholder of images are computed on
+    # upload, and cleared with the image
+    def test_upload_image_metadata(self):
+        url = image_upload_url(self.recipe.id)
+
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf:
+            Image.new('RGB', (40, 20), (255, 0, 0)).save(ntf, format='PNG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.data['image_width'], 40)
+        self.assertEqual(res.data['image_height'], 20)
+        self.assertEqual(res.data['image_color'], '#ff0000')
+        self.assertEqual(len(res.data['image_placeholder']), 28)
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.data['image_width'], 40)
+
+        self.recipe.refresh_from_db()
+        self.recipe.image = None
+        self.recipe.save()
+        self.recipe.refresh_from_db()
+        self.assertIsNone(self.recipe.image_width)
+        self.assertEqual(self.recipe.image_placeholder, '')
+
     # Test uploading an invalid image
     def test_upload_image_bad_request(self):
         url = image_upload_url(self.recipe.id)
@@ -312,3 +339,310 @@ class RecipeImageUploadTests(TestCase):
         self.assertIn(serializer1.data, res.data)
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
+
+
+# Test batch retrieval and expansion of recipe lists
+class RecipeBatchApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+
+    # Test retrieving several recipes by id in one request
+    def test_retrieve_recipes_by_ids(self):
+        recipe1 = sample_recipe(self.user, title='recipe N° 1')
+        recipe2 = sample_recipe(self.user, title='recipe N° 2')
+        sample_recipe(self.user, title='recipe N° 3')
+
+        res = self.client.get(RECIPES_URL, {
+            'ids': f'{recipe1.id},{recipe2.id}'
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(r['id'] for r in res.data),
+            [recipe1.id, recipe2.id]
+        )
+
+    # Test that IDs that are not integers are rejected
+    def test_retrieve_recipes_by_invalid_ids(self):
+        for name in ('ids', 'tags', 'ingredients'):
+            res = self.client.get(RECIPES_URL, {name: '1,abc'})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(name, res.data)
+
+    # Test inlining tags and ingredients with a fixed number of queries
+    def test_list_expand_related_objects(self):
+        for i in range(5):
+            recipe = sample_recipe(self.user, title=f'recipe N° {i}')
+            recipe.tags.add(sample_tag(self.user, name=f'tag N°{i}'))
+            recipe.ingredients.add(sample_ingredient(self.user))
+
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL, {
+                'expand': 'tags,ingredients'
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 5)
+        tag = Tag.objects.get(id=res.data[0]['tags'][0]['id'])
+        self.assertEqual(res.data[0]['tags'][0]['name'], tag.name)
+        self.assertEqual(res.data[0]['ingredients'][0]['name'], 'Cinnamon')
+
+    # Test that unexpanded lists still return related ids
+    def test_list_without_expand_returns_ids(self):
+        recipe = sample_recipe(self.user)
+        tag = sample_tag(self.user)
+        recipe.tags.add(tag)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data[0]['tags'], [tag.id])
+
+    # Test narrowing the serialized fields and the queries of a list
+    def test_list_sparse_fields(self):
+        for i in range(3):
+            recipe = sample_recipe(self.user, title=f'recipe N° {i}')
+            recipe.tags.add(sample_tag(self.user))
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, {'fields': 'title,image'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data[0]), {'id', 'title', 'image'})
+
+        full = self.client.get(RECIPES_URL)
+        self.assertLess(len(res.content), len(full.content))
+
+    # Test that only requested relations are prefetched
+    def test_list_sparse_fields_with_relation(self):
+        recipe = sample_recipe(self.user)
+        tag = sample_tag(self.user)
+        recipe.tags.add(tag)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(RECIPES_URL, {'fields': 'title,tags'})
+
+        self.assertEqual(res.data[0]['tags'], [tag.id])
+        self.assertNotIn('ingredients', res.data[0])
+
+
+# Test validation and writes of recipe tags and ingredients
+class RecipeRelatedWriteTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+
+    # Test that all the ingredients are validated with one query
+    def test_ingredients_validated_in_one_query(self):
+        ingredients = [
+            sample_ingredient(self.user, name=f'Ingredient {i}')
+            for i in range(20)
+        ]
+        serializer = RecipeSerializer(
+            data={
+                'title': 'new recipe',
+                'time_minutes': 5,
+                'price': 5.00,
+                'ingredients': [i.id for i in ingredients],
+                'tags': [],
+            },
+            context={'request': Mock(user=self.user)},
+        )
+
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+
+        self.assertEqual(serializer.validated_data['ingredients'],
+                         ingredients)
+
+    # Test that tags of another user are rejected
+    def test_create_recipe_with_other_user_tag(self):
+        user2 = get_user_model().objects.create_user(
+            'other@imran.ma',
+            'password123'
+        )
+        tag = sample_tag(user2)
+
+        payload = {
+            'title': 'new recipe',
+            'tags': [tag.id],
+            'time_minutes': 6,
+            'price': 12.00
+        }
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', res.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    # Test that invalid ids are rejected
+    def test_create_recipe_with_invalid_ingredient_id(self):
+        payload = {
+            'title': 'new recipe',
+            'ingredients': ['abc'],
+            'time_minutes': 6,
+            'price': 12.00
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ingredients', res.data)
+
+    # Test that links left unchanged by an update are not rewritten
+    def test_update_only_writes_changed_links(self):
+        recipe = sample_recipe(self.user)
+        kept = sample_tag(self.user, name='Kept')
+        removed = sample_tag(self.user, name='Removed')
+        added = sample_tag(self.user, name='Added')
+        recipe.tags.add(kept, removed)
+        link = Recipe.tags.through.objects.get(recipe=recipe, tag=kept)
+
+        res = self.client.patch(
+            detail_url(recipe.id),
+            {'tags': [kept.id, added.id]},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(recipe.tags.values_list('id', flat=True)),
+            {kept.id, added.id}
+        )
+        self.assertTrue(
+            Recipe.tags.through.objects.filter(id=link.id).exists()
+        )
+
+    # Test creating a recipe with new and existing tags and ingredients
+    def test_create_recipe_with_inline_names(self):
+        tag = sample_tag(self.user, name='Dinner')
+        ingredient = sample_ingredient(self.user, name='Salt')
+
+        payload = {
+            'title': 'new recipe',
+            'time_minutes': 6,
+            'price': 12.00,
+            'tags': [tag.id, {'name': 'Vegan'}, {'name': 'Dinner'}],
+            'ingredients': [{'name': 'Salt'}, {'name': 'Tofu'},
+                            {'name': 'Rice'}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(
+            sorted(recipe.tags.values_list('name', flat=True)),
+            ['Dinner', 'Vegan']
+        )
+        self.assertEqual(
+            sorted(recipe.ingredients.values_list('name', flat=True)),
+            ['Rice', 'Salt', 'Tofu']
+        )
+        self.assertIn(ingredient, recipe.ingredients.all())
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 3
+        )
+
+    # Test that the number of queries does not grow with new names
+    def test_create_recipe_inline_names_constant_queries(self):
+        def create(count):
+            payload = {
+                'title': f'recipe {count}',
+                'time_minutes': 6,
+                'price': 12.00,
+                'tags': [{'name': f'Tag {count}-{i}'} for i in range(count)],
+                'ingredients': [
+                    {'name': f'Ingr {count}-{i}'} for i in range(count)
+                ],
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(RECIPES_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+            return len(queries)
+
+        self.assertEqual(create(2), create(20))
+
+    # Test that an invalid name aborts the whole recipe
+    def test_create_recipe_with_invalid_name(self):
+        payload = {
+            'title': 'new recipe',
+            'time_minutes': 6,
+            'price': 12.00,
+            'tags': [{'name': 'Vegan'}],
+            'ingredients': [{'name': ''}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Tag.objects.exists())
+        self.assertFalse(Recipe.objects.exists())
+
+
+# Test the opt-in pagination of the recipe list
+class RecipePaginationTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [
+            sample_recipe(self.user, title=f'Recipe {i}') for i in range(3)
+        ]
+
+    # Test that lists are only paginated when a limit is given
+    def test_list_not_paginated_by_default(self):
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data), 3)
+
+    # Test paginating recipes, counted from the counter of the user
+    def test_list_paginated(self):
+        sample_recipe(
+            get_user_model().objects.create_user('other@imran.ma', 'pass'),
+        )
+        self.recipes[0].delete()
+
+        res = self.client.get(RECIPES_URL, {'limit': 1})
+
+        self.assertEqual(res.data['count'], 2)
+        self.assertFalse(res.data['count_is_estimate'])
+        self.assertEqual(
+            [recipe['title'] for recipe in res.data['results']],
+            ['Recipe 2']
+        )
+        self.assertIn('offset=1', res.data['next'])
+
+        res = self.client.get(RECIPES_URL, {'limit': 1, 'offset': 1})
+
+        self.assertIsNone(res.data['next'])
+
+    # Test that filtered lists past the threshold report an estimate
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=2)
+    def test_list_paginated_estimate(self):
+        tag = sample_tag(self.user)
+        for recipe in self.recipes:
+            recipe.tags.add(tag)
+
+        res = self.client.get(RECIPES_URL, {'limit': 2, 'tags': tag.id})
+
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNotNone(res.data['next'])
+        self.assertEqual(
+            res.data['count_is_estimate'],
+            connection.vendor == 'postgresql'
+        )
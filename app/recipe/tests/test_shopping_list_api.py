@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Ingredient
+
+SHOPPING_LIST_URL = reverse('recipe:recipe-shopping-list')
+
+
+# Create and return a simple recipe using the given ingredients
+def sample_recipe(user, ingredients=()):
+    recipe = Recipe.objects.create(
+        user=user,
+        title='Sample recipe',
+        time_minutes=10,
+        price=5.00
+    )
+    recipe.ingredients.add(*ingredients)
+
+    return recipe
+
+
+# Test the aggregated shopping list API
+class ShoppingListApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+
+    # Test that ingredients are merged across recipes
+    def test_shopping_list_merges_ingredients(self):
+        eggs = Ingredient.objects.create(user=self.user, name='Eggs')
+        milk = Ingredient.objects.create(user=self.user, name='Milk')
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe1 = sample_recipe(self.user, [eggs, milk])
+        recipe2 = sample_recipe(self.user, [eggs])
+        sample_recipe(self.user, [salt])
+
+        with self.assertNumQueries(1):
+            res = self.client.get(SHOPPING_LIST_URL, {
+                'ids': f'{recipe1.id},{recipe2.id},{recipe1.id}'
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': eggs.id, 'name': 'Eggs',
+             'recipes': [recipe1.id, recipe2.id]},
+            {'id': milk.id, 'name': 'Milk', 'recipes': [recipe1.id]},
+        ])
+
+    # Test that recipes of other users are ignored
+    def test_shopping_list_limited_to_user(self):
+        user2 = get_user_model().objects.create_user(
+            'other@imran.ma',
+            'password123'
+        )
+        eggs = Ingredient.objects.create(user=user2, name='Eggs')
+        recipe = sample_recipe(user2, [eggs])
+
+        res = self.client.get(SHOPPING_LIST_URL, {'ids': f'{recipe.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
+
+    # Test that invalid ids are rejected
+    def test_shopping_list_invalid_ids(self):
+        res = self.client.get(SHOPPING_LIST_URL, {'ids': 'abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
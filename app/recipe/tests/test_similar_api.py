@@ -0,0 +1,192 @@
+import random
+import threading
+import time
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, RecipeBucket, RecipeSignature, Tag, \
+    Ingredient
+
+from recipe import similarity
+
+
+# Return URL for the recipes similar to a recipe
+def similar_url(recipe_id):
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+# Create and return a recipe with the given tags and ingredients
+def sample_recipe(user, tags=(), ingredients=(), **params):
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 5,
+        'price': 10.00
+    }
+    defaults.update(params)
+
+    recipe = Recipe.objects.create(user=user, **defaults)
+    recipe.tags.add(*tags)
+    recipe.ingredients.add(*ingredients)
+
+    return recipe
+
+
+# Test the similar recipes API
+class SimilarRecipesApiTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@imran.ma',
+            'password123'
+        )
+        self.client.force_authenticate(self.user)
+
+        self.tags = [
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+            for i in range(4)
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'Ingr {i}')
+            for i in range(8)
+        ]
+
+    # Test that the closest recipe comes first
+    def test_similar_recipes_ranked(self):
+        recipe = sample_recipe(self.user, self.tags[:2],
+                               self.ingredients[:4])
+        close = sample_recipe(self.user, self.tags[:2],
+                              self.ingredients[:3])
+        sample_recipe(self.user, self.tags[2:], self.ingredients[4:])
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['id'], close.id)
+        self.assertEqual(res.data[0]['similarity'], round(5 / 6, 4))
+        self.assertNotIn(recipe.id, [r['id'] for r in res.data])
+
+    # Test that recipes of other users are never suggested
+    def test_similar_recipes_limited_to_user(self):
+        user2 = get_user_model().objects.create_user(
+            'other@imran.ma',
+            'password123'
+        )
+        recipe = sample_recipe(self.user, self.tags, self.ingredients)
+        other = Recipe.objects.create(
+            user=user2, title='Other', time_minutes=1, price=1
+        )
+        other.tags.add(*self.tags)
+
+        res = self.client.get(similar_url(recipe.id))
+        self.assertEqual(res.data, [])
+
+        res = self.client.get(similar_url(other.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    # Test that signatures follow changes of tags and ingredients
+    def test_signature_updated_on_m2m_changes(self):
+        recipe = sample_recipe(self.user, self.tags[:1])
+        signature = RecipeSignature.objects.get(recipe=recipe).minhash
+
+        recipe.ingredients.add(self.ingredients[0])
+        self.assertNotEqual(
+            RecipeSignature.objects.get(recipe=recipe).minhash,
+            signature
+        )
+        self.assertEqual(
+            RecipeBucket.objects.filter(recipe=recipe).count(),
+            similarity.BANDS
+        )
+
+        recipe.tags.clear()
+        self.ingredients[0].delete()
+        self.assertEqual(
+            RecipeSignature.objects.get(recipe=recipe).minhash, []
+        )
+        self.assertFalse(RecipeBucket.objects.filter(recipe=recipe).exists())
+
+    # Test that the LSH index finds the closest recipes of brute force
+    def test_lsh_recall_against_brute_force(self):
+        rng = random.Random(42)
+        base = set(rng.sample(self.ingredients, 6))
+        recipes = []
+        for i in range(30):
+            ingredients = set(base)
+            if i % 3:
+                ingredients = set(rng.sample(self.ingredients, 4))
+            recipes.append(sample_recipe(
+                self.user,
+                rng.sample(self.tags, 2),
+                ingredients,
+            ))
+
+        for recipe in recipes:
+            exact = [
+                recipe_id for recipe_id, score in
+                similarity.similar_recipes(recipe, 100, brute_force=True)
+                if score >= 0.8
+            ]
+            found = [
+                recipe_id for recipe_id, _ in
+                similarity.similar_recipes(recipe, 100)
+            ]
+            for recipe_id in exact:
+                self.assertIn(recipe_id, found)
+
+    # Test building signatures of existing recipes
+    def test_build_similarity_index_command(self):
+        recipe = sample_recipe(self.user, self.tags[:1])
+        RecipeSignature.objects.all().delete()
+        RecipeBucket.objects.all().delete()
+
+        call_command('build_similarity_index', stdout=StringIO())
+
+        self.assertTrue(RecipeSignature.objects.filter(recipe=recipe).exists())
+
+
+# Test signatures updated concurrently, on PostgreSQL whose transactions
+# run concurrently
+@skipUnless(connection.vendor == 'postgresql', 'Not PostgreSQL')
+class SignatureConcurrencyTests(TransactionTestCase):
+
+    # Test that updating the signature of a recipe while another update is
+    # in progress waits for it instead of conflicting with its rows
+    def test_concurrent_updates(self):
+        user = get_user_model().objects.create_user('user@imran.ma')
+        tag = Tag.objects.create(user=user, name='Vegan')
+        recipe = sample_recipe(user, [tag])
+        RecipeSignature.objects.all().delete()
+        RecipeBucket.objects.all().delete()
+        errors = []
+
+        def update():
+            try:
+                similarity.update_signatures([recipe.id])
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            similarity.update_signatures([recipe.id])
+            thread = threading.Thread(target=update)
+            thread.start()
+            time.sleep(0.2)
+        thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(RecipeSignature.objects.count(), 1)
+        self.assertEqual(
+            RecipeBucket.objects.count(),
+            similarity.BANDS
+        )
@@ -1,15 +1,60 @@
+import mimetypes
+import os
+
+from django.conf import settings
+from django.http import Http404
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import mixins, viewsets, status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from recipe import pantry, serializers, similarity
+from recipe.pagination import EstimatedCountPagination
+from core import changes, media, stats
+from core.counting import estimated_count
+from core.models import Ingredient, Recipe, Tag, Tombstone
+
+
+# Narrow responses and querysets to the fields asked with `?fields=`
+class SparseFieldsViewSetMixin:
+    sparse_field_actions = ('list', 'retrieve')
+
+    # Return the requested field names, or None to serialize every field
+    def _requested_fields(self):
+        fields = self.request.query_params.get('fields')
+
+        if not fields or self.action not in self.sparse_field_actions:
+            return None
+
+        return set(fields.split(',')) | {'id'}
+
+    # Only load the requested columns of the model
+    def _only_requested_fields(self, queryset):
+        fields = self._requested_fields()
+        if fields is None:
+            return queryset
+
+        columns = {
+            field.name for field in queryset.model._meta.concrete_fields
+        }
+        return queryset.only(*(fields & columns))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        fields = self._requested_fields()
+
+        if fields is not None:
+            context['fields'] = fields
 
-from recipe import serializers
-from core.models import Ingredient, Recipe, Tag
+        return context
 
 
 # Base viewset for user owned recipe attributes
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
+class BaseRecipeAttrViewSet(SparseFieldsViewSetMixin,
+                            viewsets.GenericViewSet, mixins.ListModelMixin,
                             mixins.CreateModelMixin, mixins.UpdateModelMixin,
                             mixins.RetrieveModelMixin):
     authentication_classes = (TokenAuthentication,)
@@ -23,6 +68,8 @@ class BaseRecipeAttrViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
         if assigned_only:
             queryset = queryset.filter(recipe__isnull=False)
 
+        queryset = self._only_requested_fields(queryset)
+
         return queryset.filter(user=self.request.user).order_by('-name')
 
     # Create a new tag
@@ -43,41 +90,93 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
 
 
 # Manage recipes in database
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = EstimatedCountPagination
+    # Most recipes a pantry search returns
+    max_pantry_limit = 200
 
     # Convert a list of string IDs to a list of integers
     def _params_to_ints(self, query_str):
         return [int(str_id) for str_id in query_str.split(',')]
 
+    # Return the IDs of a query parameter, rejecting the request with a 400
+    # when they are not integers
+    def _query_ids(self, name):
+        try:
+            return self._params_to_ints(self.request.query_params[name])
+        except ValueError:
+            raise ValidationError({name: 'Expected comma separated IDs.'})
+
     # Retrieve the recipes for the authenticated user
     def get_queryset(self):
+        ids = self.request.query_params.get('ids')
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
 
         queryset = self.queryset
 
+        if self.action in ('list', 'retrieve'):
+            fields = self._requested_fields()
+            queryset = self._only_requested_fields(queryset)
+            queryset = queryset.prefetch_related(*(
+                name for name in ('tags', 'ingredients')
+                if fields is None or name in fields
+            ))
+
+        if self.action == 'image':
+            queryset = queryset.only('id', 'user_id', 'image')
+
+        if ids and self.action == 'list':
+            queryset = queryset.filter(id__in=self._query_ids('ids'))
+
         if tags:
-            tag_ids = self._params_to_ints(tags)
+            tag_ids = self._query_ids('tags')
             queryset = queryset.filter(tags__id__in=tag_ids)
 
         if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
+            ingredient_ids = self._query_ids('ingredients')
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
 
         return queryset.filter(user=self.request.user)
 
+    # Count the listed recipes for the pagination: unfiltered lists use the
+    # counter of the user, filtered ones are counted up to a threshold
+    def get_list_count(self, queryset):
+        params = self.request.query_params
+        if not any(params.get(name) for name in
+                   ('ids', 'tags', 'ingredients')):
+            return stats.recipe_count(self.request.user.id), False
+
+        return estimated_count(queryset)
+
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return serializers.RecipeDetailSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'pantry':
+            return serializers.RecipePantrySerializer
+        elif self.action == 'similar':
+            return serializers.RecipeSimilarSerializer
+        elif self.action == 'shopping_list':
+            return serializers.ShoppingListItemSerializer
 
         return self.serializer_class
 
+    # Inline the related objects requested with `?expand=` in lists
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        expand = self.request.query_params.get('expand')
+
+        if expand and self.action == 'list':
+            context['expand'] = set(expand.split(','))
+
+        return context
+
     # Create a new recipe
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -102,3 +201,271 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    # Send the image of a recipe once its ownership is checked, resized to
+    # `?width=` pixels in `?type=` (`?format=` is taken by DRF) when given,
+    # both from an allowlist. Files are sent by nginx, renditions are cached
+    # on disk, and clients can cache URLs with the current `?v=` for good.
+    @action(methods=['GET'], detail=True, url_path='image')
+    def image(self, request, pk=None):
+        width = request.query_params.get('width')
+        image_format = request.query_params.get('type')
+        try:
+            if width is not None:
+                width = int(width)
+            elif image_format is not None:
+                width = max(media.RENDITION_WIDTHS)
+        except ValueError:
+            width = 0
+
+        if width is not None and (
+                width not in media.RENDITION_WIDTHS
+                or (image_format or 'jpeg') not in media.RENDITION_FORMATS):
+            return Response(
+                {'detail': 'Invalid rendition parameters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        recipe = self.get_object()
+        if not recipe.image or not os.path.exists(recipe.image.path):
+            raise Http404
+
+        immutable = request.query_params.get('v') \
+            == media.image_version(recipe.image.name)
+
+        if width is None:
+            return media.file_response(
+                request,
+                recipe.image.path,
+                settings.MEDIA_ACCEL_URL + recipe.image.name,
+                mimetypes.guess_type(recipe.image.name)[0]
+                or 'application/octet-stream',
+                immutable=immutable,
+            )
+
+        image_format = image_format or 'jpeg'
+        name, path = media.get_rendition(
+            recipe.image.path,
+            recipe.image.name,
+            width,
+            image_format,
+        )
+
+        return media.file_response(
+            request,
+            path,
+            settings.RENDITION_URL + name,
+            media.RENDITION_FORMATS[image_format][1],
+            immutable=immutable,
+        )
+
+    # List the recipes that can be cooked with the ingredients on hand,
+    # ranked by the number of missing ingredients
+    @action(methods=['GET'], detail=False, url_path='pantry')
+    def pantry(self, request):
+        try:
+            ingredients = request.query_params.get('ingredients', '')
+            ingredient_ids = self._params_to_ints(ingredients) \
+                if ingredients else []
+            max_missing = int(request.query_params.get('max_missing', 0))
+            limit = int(request.query_params.get('limit', 50))
+        except ValueError:
+            return Response(
+                {'detail': 'Invalid pantry parameters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if max_missing < 0 or not 1 <= limit <= self.max_pantry_limit:
+            return Response(
+                {'detail': 'Invalid pantry parameters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        index = pantry.get_index(request.user.id)
+        matches = index.match(ingredient_ids, max_missing, limit)
+        missing = dict(matches)
+
+        recipes = Recipe.objects.filter(
+            user=request.user,
+            id__in=missing,
+        ).prefetch_related('tags', 'ingredients').in_bulk()
+
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _ in matches
+             if recipe_id in recipes],
+            many=True,
+            context={**self.get_serializer_context(), 'missing': missing}
+        )
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    # List the recipes closest to a recipe by their tags and ingredients
+    @action(methods=['GET'], detail=True, url_path='similar')
+    def similar(self, request, pk=None):
+        recipe = self.get_object()
+
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 0
+
+        if limit < 1:
+            return Response(
+                {'detail': 'Invalid limit'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        scores = similarity.similar_recipes(recipe, limit)
+        recipes = Recipe.objects.filter(
+            user=request.user,
+            id__in=[recipe_id for recipe_id, _ in scores],
+        ).prefetch_related('tags', 'ingredients').in_bulk()
+
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _ in scores
+             if recipe_id in recipes],
+            many=True,
+            context={
+                **self.get_serializer_context(),
+                'similarity': dict(scores),
+            }
+        )
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    # Return the deduplicated ingredients needed by a set of recipes, with
+    # the recipes needing each one, in a single query
+    @action(methods=['GET'], detail=False, url_path='shopping-list')
+    def shopping_list(self, request):
+        try:
+            recipe_ids = set(
+                self._params_to_ints(request.query_params.get('ids', ''))
+            )
+        except ValueError:
+            return Response(
+                {'detail': 'Invalid recipe ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = Recipe.ingredients.through.objects.filter(
+            recipe__user=request.user,
+            recipe_id__in=recipe_ids,
+        ).values_list(
+            'ingredient_id', 'ingredient__name', 'recipe_id'
+        ).order_by('ingredient__name', 'ingredient_id', 'recipe_id')
+
+        items = {}
+        for ingredient_id, name, recipe_id in rows:
+            item = items.setdefault(
+                ingredient_id,
+                {'id': ingredient_id, 'name': name, 'recipes': []}
+            )
+            item['recipes'].append(recipe_id)
+
+        serializer = self.get_serializer(list(items.values()), many=True)
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+# Return the recipes, tags and ingredients of the user created, updated or
+# deleted after the position `?since=` of their change sequence, at most
+# `?limit=` of them, with the token to send as `since` next time. Without
+# `since` all of them are returned. Tokens older than the pruned tombstones
+# get a 410: the client must sync everything again.
+class ChangesView(APIView):
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    max_limit = 1000
+    # Prefix of the tokens continuing a full sync
+    full_sync_prefix = 'full-'
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        full = since is None or since.startswith(self.full_sync_prefix)
+        try:
+            position = 0 if since is None else int(
+                since.removeprefix(self.full_sync_prefix)
+            )
+            limit = int(request.query_params.get('limit', 500))
+        except ValueError:
+            limit = 0
+
+        if limit < 1 or limit > self.max_limit:
+            return Response(
+                {'detail': 'Invalid sync parameters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Syncs resumed from before the pruned tombstones would miss the
+        # deletions of rows they were sent, whether they started with a
+        # token or not
+        until, pruned = changes.current_change_seq(request.user.id)
+        oldest = 0 if full and not position else pruned
+        if not oldest <= position <= until:
+            return Response(
+                {'detail': 'Sync token expired, sync everything again'},
+                status=status.HTTP_410_GONE
+            )
+
+        window = {
+            'user': request.user,
+            'change_seq__gt': position,
+            'change_seq__lte': until,
+        }
+        querysets = {
+            'recipes': Recipe.objects.prefetch_related('tags', 'ingredients'),
+            'tags': Tag.objects.all(),
+            'ingredients': Ingredient.objects.all(),
+        }
+
+        # The changes of each kind come in sequence order from the user and
+        # change_seq indexes: merge the first `limit` of them. Pages after
+        # the first of a full sync take the deletions since the previous
+        # page too.
+        rows = []
+        for key, queryset in querysets.items():
+            queryset = queryset.filter(**window).order_by('change_seq')
+            rows += [
+                (obj.change_seq, key, obj) for obj in queryset[:limit + 1]
+            ]
+        if since is not None:
+            rows += [
+                (tombstone.change_seq, 'deleted', tombstone)
+                for tombstone in Tombstone.objects.filter(
+                    **window
+                ).order_by('change_seq')[:limit + 1]
+            ]
+
+        rows.sort(key=lambda row: row[0])
+        has_more = len(rows) > limit
+        if has_more:
+            rows = rows[:limit]
+            token = str(rows[-1][0])
+            if full:
+                token = self.full_sync_prefix + token
+        else:
+            token = str(until)
+
+        grouped = {key: [] for key in (*querysets, 'deleted')}
+        for _, key, obj in rows:
+            grouped[key].append(obj)
+
+        context = {'request': request}
+        deleted = {f'{kind}s': [] for kind, _ in Tombstone.KIND_CHOICES}
+        for tombstone in grouped['deleted']:
+            deleted[f'{tombstone.kind}s'].append(tombstone.object_id)
+
+        return Response({
+            'token': token,
+            'has_more': has_more,
+            'recipes': serializers.RecipeSerializer(
+                grouped['recipes'], many=True, context=context
+            ).data,
+            'tags': serializers.TagSerializer(
+                grouped['tags'], many=True, context=context
+            ).data,
+            'ingredients': serializers.IngredientSerializer(
+                grouped['ingredients'], many=True, context=context
+            ).data,
+            'deleted': deleted,
+        })
@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model, authenticate
 from django.utils.translation import trim_whitespace
 from django.utils.translation import gettext_lazy as _
-from rest_framework import serializers
+from rest_framework import exceptions, serializers
+
+from core.hashers import VerificationBusy, verification_slot
 
 
 # Serializer for th user object
@@ -50,10 +52,14 @@ class AuthTokenSerializer(serializers.Serializer):
         email = attrs.get('email')
         password = attrs.get('password')
 
-        user = authenticate(request=self.context.get('request'),
-                            email=email,
-                            password=password
-                            )
+        try:
+            with verification_slot():
+                user = authenticate(request=self.context.get('request'),
+                                    email=email,
+                                    password=password
+                                    )
+        except VerificationBusy:
+            raise exceptions.Throttled(wait=1)
 
         if not user:
             msg = _('Unable to authenticate with provided credentials')
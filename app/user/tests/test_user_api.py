@@ -1,10 +1,17 @@
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 
 from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core.deletion import purge_user
+from core.hashers import VerificationBusy
+from core.models import Job
+
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
@@ -18,6 +25,8 @@ def create_user(**params):
 class PublicUserApiTests(TestCase):
 
     def setUp(self):
+        # Start from fresh login and sign up budgets
+        cache.clear()
         self.client = APIClient()
 
     # Test creating user with valid payload is successful
@@ -104,6 +113,23 @@ class PublicUserApiTests(TestCase):
         self.assertNotIn('token', res.data)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    # Test that logins are told to retry when passwords cannot be verified
+    # right away
+    def test_create_token_busy(self):
+        create_user(email='testmail@imran.ma', password='testpass123')
+
+        with patch(
+            'user.serializers.verification_slot',
+            side_effect=VerificationBusy
+        ):
+            res = self.client.post(TOKEN_URL, {
+                'email': 'testmail@imran.ma',
+                'password': 'testpass123',
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res['Retry-After'], '1')
+
     # Test that email and password are required
     def test_creating_user_missing_fields(self):
         res = self.client.post(TOKEN_URL,
@@ -165,3 +191,15 @@ class PrivateUserApiTests(TestCase):
         self.assertTrue(self.user.check_password(payload['password']))
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    # Test that deleting the account deactivates it and queues its purge
+    def test_delete_me(self):
+        res = self.client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertTrue(
+            Job.objects.filter(task=purge_user.task_name,
+                               args=[self.user.id]).exists()
+        )
@@ -2,6 +2,7 @@ from rest_framework import generics, authentication, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
+from core.deletion import delete_user
 from user import serializers
 
 
@@ -14,10 +15,12 @@ class CreateUserView(generics.CreateAPIView):
 class CreateTokenView(ObtainAuthToken):
     serializer_class = serializers.AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = 'login'
 
 
 # Manage the authenticated user
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = serializers.UserSerializer
     authentication_classes = (authentication.TokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
@@ -25,3 +28,7 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     # Retrieve and return authenticated user
     def get_object(self):
         return self.request.user
+
+    # Deactivate the account right away and delete its data in the background
+    def perform_destroy(self, instance):
+        delete_user(instance)
@@ -1,13 +1,41 @@
 server {
     listen ${LISTEN_PORT};
 
-    location /static {
-        alias /vol/static;
+    # Compress the responses Django sent uncompressed (COMPRESSION_MODE set
+    # to proxy); responses with a Content-Encoding are passed as they are
+    gzip on;
+    gzip_proxied any;
+    gzip_vary on;
+    gzip_min_length 1024;
+    gzip_types application/json application/javascript text/css
+               image/svg+xml;
+
+    # Only the static files are public: media files and renditions are sent
+    # through the API, which checks ownership
+    location /static/static {
+        alias /vol/static/static;
+        # Send the .gz files written by collectstatic
+        gzip_static on;
+    }
+
+    # Media files, sent once Django checked the request. The Cache-Control
+    # set by Django is kept; nginx handles conditional and range requests.
+    location /internal/media/ {
+        internal;
+        alias /vol/static/media/;
+    }
+
+    # Resized recipe images, sent once Django checked the request
+    location /internal/renditions/ {
+        internal;
+        alias /vol/static/renditions/;
     }
 
     location / {
         uwsgi_pass              ${APP_HOST}:${APP_PORT};
         include                 /etc/nginx/uwsgi_params;
+        # Replace the address list sent by the client, which it can forge
+        uwsgi_param             HTTP_X_FORWARDED_FOR $remote_addr;
         client_max_body_size    10M;
     }
 }
\ No newline at end of file
@@ -8,7 +8,11 @@ ls -la /vol/web
 whoami
 
 python manage.py wait_for_db
-python manage.py collectstatic --noinput
-python manage.py migrate
+# Only collect and migrate when something changed since the last start
+python manage.py collectstatic_if_changed
+python manage.py migrate --check || python manage.py migrate
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file
+# The app is loaded and warmed up in the master, then forked to the workers
+uwsgi --socket :9000 --workers 4 --master --enable-threads \
+      --need-app --single-interpreter --die-on-term --vacuum \
+      --module app.wsgi